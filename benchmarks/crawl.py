@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import AutoCrawler
+from fake_search import FakeSearchServer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+SCENARIOS = {
+    'google': {'site': 'google', 'full': False},
+    'naver': {'site': 'naver', 'full': False},
+    'google_full': {'site': 'google', 'full': True},
+    'naver_full': {'site': 'naver', 'full': True},
+    'google_limit': {'site': 'google', 'full': False, 'limit': 50},
+    # Compared against the default profile scenario when both run in the same invocation.
+    'google_lean': {'site': 'google', 'full': False, 'profile': 'lean', 'compare': 'google'},
+    'naver_lean': {'site': 'naver', 'full': False, 'profile': 'lean', 'compare': 'naver'},
+    'google_tabs': {'site': 'google', 'full': False, 'tabs': 4, 'compare': 'google'},
+    'naver_tabs': {'site': 'naver', 'full': False, 'tabs': 4, 'compare': 'naver'},
+    'google_http': {'site': 'google', 'full': False, 'browserless': True},
+    'naver_http': {'site': 'naver', 'full': False, 'browserless': True},
+    'flaky': {'site': 'google', 'full': False, 'image_latency': 0.3, 'error_rate': 0.1, 'throttle_rate': 0.02},
+}
+
+
+class BenchCrawler(AutoCrawler):
+    def __init__(self, keywords, **kwargs):
+        super().__init__(**kwargs)
+        self.keywords = keywords
+
+    def get_keywords(self, keywords_file='keywords.txt'):
+        return self.keywords
+
+
+class RssSampler:
+    # Peak resident memory of the whole process tree: the crawler, its workers, chromedriver and Chrome.
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @staticmethod
+    def tree_rss():
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.tree_rss())
+
+    def __enter__(self):
+        if psutil is not None:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        if psutil is not None:
+            self.thread.join()
+        else:
+            # Without psutil only the largest single child is known (ru_maxrss is in KB on Linux).
+            self.peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_scenario(name, scenario, args):
+    server = FakeSearchServer(results=args.results, page_delay=args.page_delay,
+                              image_latency=scenario.get('image_latency', args.image_latency),
+                              error_rate=scenario.get('error_rate', args.error_rate),
+                              throttle_rate=scenario.get('throttle_rate', 0.0)).start()
+    work_dir = tempfile.mkdtemp(prefix='autocrawler-bench-')
+    download_path = os.path.relpath(os.path.join(work_dir, 'download'))
+
+    crawler = BenchCrawler(['{} {}'.format(name, i) for i in range(args.keywords)], skip_already_exist=False,
+                           n_threads=args.threads, do_google=scenario['site'] == 'google',
+                           do_naver=scenario['site'] == 'naver', download_path=download_path,
+                           full_resolution=scenario['full'], no_gui=True, limit=scenario.get('limit', 0),
+                           link_cache_ttl=0, page_rate=0, image_rate=0, search_urls=server.search_urls,
+                           rebalance='off', browserless=scenario.get('browserless', False),
+                           browser_profile=scenario.get('profile', args.browser_profile),
+                           tabs=scenario.get('tabs', args.tabs))
+
+    try:
+        cpu_start = cpu_seconds()
+        start = time.time()
+        with RssSampler() as sampler:
+            crawler.do_crawling()
+        elapsed = time.time() - start
+        cpu = cpu_seconds() - cpu_start
+
+        with open(os.path.join(download_path, '.run_report.json'), encoding='utf-8') as f:
+            report = json.load(f)
+    finally:
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    links = sum(site['links_found'] for site in report['sites'].values())
+    images = sum(site['images'] for site in report['sites'].values())
+
+    return {
+        'scenario': name,
+        'elapsed': round(elapsed, 3),
+        'links': links,
+        'images': images,
+        'links_per_second': round(links / elapsed, 3),
+        'images_per_second': round(images / elapsed, 3),
+        'peak_rss_mb': round(sampler.peak / 1024 / 1024, 1),
+        # Per concurrent collection: with tabs a worker runs several of them in one browser.
+        'peak_rss_per_worker_mb': round(sampler.peak / 1024 / 1024 /
+                                        min(args.threads * scenario.get('tabs', args.tabs), args.keywords), 1),
+        'cpu_seconds': round(cpu, 3),
+        'phases': {phase: {'count': h['count'], 'wall': h['sum'], 'cpu': h['cpu']}
+                   for phase, h in report['phases'].items()},
+        'tasks': {'done': report['tasks']['done'], 'failed': report['tasks']['failed']},
+        'server': dict(server.stats),
+    }
+
+
+def print_result(result, baseline=None):
+    def delta(key):
+        if not baseline or not baseline.get(key):
+            return ''
+        return ' ({:+.1f}%)'.format((result[key] - baseline[key]) / baseline[key] * 100)
+
+    print('_________________________________')
+    print('{} | {:.1f}s | 링크 : {} ({:.1f}/s{}) | 이미지 : {} ({:.1f}/s{}) | 최대 메모리 : {:.0f}MB{} '
+          '(워커당 {:.0f}MB{}) | CPU : {:.1f}s{}'
+          .format(result['scenario'], result['elapsed'], result['links'], result['links_per_second'],
+                  delta('links_per_second'), result['images'], result['images_per_second'],
+                  delta('images_per_second'), result['peak_rss_mb'], delta('peak_rss_mb'),
+                  result['peak_rss_per_worker_mb'], delta('peak_rss_per_worker_mb'), result['cpu_seconds'],
+                  delta('cpu_seconds')))
+    for phase, h in sorted(result['phases'].items()):
+        average = ''
+        if baseline and phase in baseline['phases'] and baseline['phases'][phase]['count'] and h['count']:
+            before = baseline['phases'][phase]['wall'] / baseline['phases'][phase]['count']
+            average = ' | 평균 : {:.3f}s (이전 {:.3f}s)'.format(h['wall'] / h['count'], before)
+        print('    {:<16} {:>6}회 | 시간 : {:8.3f}s | CPU : {:8.3f}s{}'.format(phase, h['count'], h['wall'], h['cpu'],
+                                                                          average))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='로컬 가짜 검색 서버로 AutoCrawler 전체 과정을 측정합니다.')
+    parser.add_argument('scenarios', nargs='*', default=['google', 'naver'],
+                        help='실행할 시나리오 : {}'.format(', '.join(SCENARIOS)))
+    parser.add_argument('--keywords', type=int, default=4, help='시나리오당 키워드 수')
+    parser.add_argument('--results', type=int, default=200, help='키워드당 검색 결과 수')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--page-delay', type=float, default=0.2, help='페이지와 추가 결과 로딩 지연(초)')
+    parser.add_argument('--image-latency', type=float, default=0.05, help='이미지 응답 지연(초)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='이미지 요청 중 500 응답 비율')
+    parser.add_argument('--browser-profile', type=str, default='default', choices=['default', 'lean'],
+                        help='profile 이 지정되지 않은 시나리오의 브라우저 프로필')
+    parser.add_argument('--tabs', type=int, default=1, help='tabs 가 지정되지 않은 시나리오의 워커당 창 수')
+    parser.add_argument('--output', type=str, default='', help='결과를 저장할 JSON 파일')
+    parser.add_argument('--baseline', type=str, default='', help='비교할 이전 결과 JSON 파일')
+    parser.add_argument('--keep', action='store_true', help='다운로드한 파일을 지우지 않습니다.')
+    args = parser.parse_args()
+
+    baselines = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines = {result['scenario']: result for result in json.load(f)}
+
+    results = []
+    for name in args.scenarios:
+        result = run_scenario(name, SCENARIOS[name], args)
+        results.append(result)
+        compare = [r for r in results if r['scenario'] == SCENARIOS[name].get('compare')]
+        print_result(result, baselines.get(name) or (compare[0] if compare else None))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print('결과 저장 : {}'.format(args.output))
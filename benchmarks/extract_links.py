@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collect_links import CollectLinks
+
+
+def measure(collect, site, batch_extract, repeat):
+    collect.batch_extract = batch_extract
+    extract = collect.google_links if site == 'google' else collect.naver_links
+
+    best = None
+    links = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        links, _ = extract(set())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, links
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='저장된 검색 결과 페이지에서 요소별 추출과 일괄 추출을 비교합니다.')
+    parser.add_argument('pages', nargs='+', help='저장된 Google/Naver 이미지 검색 결과 HTML 파일')
+    parser.add_argument('--site', type=str, default='google', choices=['google', 'naver'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no_gui', type=str, default='true')
+    args = parser.parse_args()
+
+    collect = CollectLinks(no_gui=str(args.no_gui).lower() != 'false')
+
+    try:
+        for page in args.pages:
+            collect.browser.get(Path(page).resolve().as_uri())
+
+            element_time, element_links = measure(collect, args.site, False, args.repeat)
+            batch_time, batch_links = measure(collect, args.site, True, args.repeat)
+
+            print('{} | 링크 : {} | 요소별 : {:.3f}s | 일괄 : {:.3f}s | {:.1f}배 | 결과 일치 : {}'
+                  .format(page, len(batch_links), element_time, batch_time, element_time / max(batch_time, 1e-9),
+                          element_links == batch_links))
+    finally:
+        collect.browser.quit()
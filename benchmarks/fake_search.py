@@ -0,0 +1,319 @@
+import json
+import time
+import zlib
+import random
+import struct
+import argparse
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+# Synthetic image search pages. The markup only reproduces what CollectLinks looks at: the result grids, the
+# "show more" button, the embedded result data read by full_res_resolver and the full resolution viewers.
+
+GOOGLE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{keyword} - Google 검색</title>
+<style>
+.bRMDJf {{ display: inline-block; width: 200px; height: 220px; margin: 4px; }}
+.bRMDJf img {{ width: 180px; height: 180px; }}
+#islsp {{ position: fixed; top: 0; right: 0; width: 400px; height: 100%; background: #fff; }}
+</style></head>
+<body>
+<div id="islrg">{boxes}</div>
+<input type="button" id="more" value="결과 더보기" style="display: none" onclick="more()">
+<div id="islsp" style="display: none"><div class="v4dQwb"><img class="n3VNCb" src="">
+<div class="k7O2sd" style="display: none;"></div></div></div>
+<script nonce="">AF_initDataCallback({{key: 'ds:1', data: {data}}});</script>
+<script>
+var total = {total}, batch = {batch}, pageDelay = {page_delay}, buttonEvery = {button_every};
+var thumbs = {thumbs}, originals = {originals};
+var loading = false, current = -1;
+function box(i) {{
+    var div = document.createElement('div');
+    div.className = 'bRMDJf islir';
+    div.setAttribute('data-ri', i);
+    div.onclick = function () {{ view(i); }};
+    var img = document.createElement('img');
+    img.src = thumbs[i];
+    div.appendChild(img);
+    return div;
+}}
+function shown() {{ return document.getElementsByClassName('bRMDJf').length; }}
+function load() {{
+    var n = shown();
+    if (loading || n >= total) return;
+    if (n % buttonEvery === 0 && document.getElementById('more').style.display === 'none' && n > 0
+            && !document.getElementById('more').dataset.clicked) {{
+        document.getElementById('more').style.display = 'block';
+        return;
+    }}
+    loading = true;
+    setTimeout(function () {{
+        var grid = document.getElementById('islrg');
+        for (var i = n; i < Math.min(n + batch, total); i++) grid.appendChild(box(i));
+        loading = false;
+        document.getElementById('more').dataset.clicked = '';
+    }}, pageDelay);
+}}
+function more() {{
+    var button = document.getElementById('more');
+    button.style.display = 'none';
+    button.dataset.clicked = '1';
+    load();
+}}
+function view(i) {{
+    if (i >= shown()) return;
+    current = i;
+    var bar = document.querySelector('.k7O2sd');
+    var img = document.querySelector('.n3VNCb');
+    document.getElementById('islsp').style.display = 'block';
+    bar.setAttribute('style', 'display: block;');
+    img.src = thumbs[i];
+    setTimeout(function () {{ img.src = originals[i]; bar.setAttribute('style', 'display: none;'); }}, pageDelay);
+}}
+window.addEventListener('scroll', function () {{
+    if (window.innerHeight + window.pageYOffset >= document.body.scrollHeight - 400) load();
+}});
+document.body.addEventListener('keydown', function (e) {{
+    if (current >= 0 && (e.key === 'ArrowRight' || e.keyCode === 39)) {{ load(); view(current + 1); }}
+}});
+document.body.tabIndex = 0;
+</script>
+</body></html>
+"""
+
+NAVER_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{keyword} : 네이버 이미지검색</title>
+<style>
+.photo_bx {{ display: inline-block; width: 200px; height: 220px; margin: 4px; }}
+.photo_bx img {{ width: 180px; height: 180px; }}
+#viewer {{ position: fixed; top: 0; right: 0; width: 400px; height: 100%; background: #fff; }}
+</style></head>
+<body>
+<div id="grid">{boxes}</div>
+<div id="viewer" style="display: none"></div>
+<script>var imageSearchData = {data};</script>
+<script>
+var total = {total}, batch = {batch}, pageDelay = {page_delay};
+var thumbs = {thumbs}, originals = {originals};
+var loading = false, current = -1;
+function box(i) {{
+    var div = document.createElement('div');
+    div.className = 'photo_bx api_ani_send _photoBox';
+    div.onclick = function () {{ view(i); }};
+    var img = document.createElement('img');
+    img.className = '_image _listImage';
+    img.src = thumbs[i];
+    div.appendChild(img);
+    return div;
+}}
+function shown() {{ return document.getElementsByClassName('_photoBox').length; }}
+function load() {{
+    var n = shown();
+    if (loading || n >= total) return;
+    loading = true;
+    setTimeout(function () {{
+        var grid = document.getElementById('grid');
+        for (var i = n; i < Math.min(n + batch, total); i++) grid.appendChild(box(i));
+        loading = false;
+    }}, pageDelay);
+}}
+function view(i) {{
+    if (i >= shown()) return;
+    current = i;
+    var viewer = document.getElementById('viewer');
+    viewer.style.display = 'block';
+    var div = document.createElement('div');
+    div.className = 'image _imageBox';
+    var img = document.createElement('img');
+    img.className = '_image';
+    img.src = originals[i];
+    div.appendChild(img);
+    viewer.innerHTML = '';
+    viewer.appendChild(div);
+}}
+window.addEventListener('scroll', function () {{
+    if (window.innerHeight + window.pageYOffset >= document.body.scrollHeight - 400) load();
+}});
+document.body.addEventListener('keydown', function (e) {{
+    if (current >= 0 && (e.key === 'ArrowRight' || e.keyCode === 39)) {{ load(); view(current + 1); }}
+}});
+document.body.tabIndex = 0;
+</script>
+</body></html>
+"""
+
+
+def png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+
+
+@lru_cache(maxsize=4096)
+def make_png(seed, size):
+    # Random pixels per seed, so neither the exact nor the perceptual dedup collapses the synthetic results.
+    rng = random.Random(seed)
+    rows = b''.join(b'\x00' + bytes(rng.getrandbits(8) for _ in range(size * 3)) for _ in range(size))
+    header = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', header) + png_chunk(b'IDAT', zlib.compress(rows, 1)) + \
+        png_chunk(b'IEND', b'')
+
+
+class FakeSearchServer:
+    def __init__(self, host='127.0.0.1', port=0, results=200, batch=50, button_every=100, page_delay=0.2,
+                 image_latency=0.05, error_rate=0.0, throttle_rate=0.0, thumb_size=16, image_size=64, seed=0):
+        self.results = results
+        self.batch = batch
+        self.button_every = button_every
+        self.page_delay = page_delay
+        self.image_latency = image_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.thumb_size = thumb_size
+        self.image_size = image_size
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'pages': 0, 'images': 0, 'errors': 0, 'throttled': 0, 'bytes': 0}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    @property
+    def search_urls(self):
+        return {'google': self.url + '/search', 'naver': self.url + '/search.naver'}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+    def image_urls(self, keyword):
+        key = zlib.crc32(keyword.encode('utf-8'))
+        thumbs = ['{}/thumb/{}/{}.png'.format(self.url, key, i) for i in range(self.results)]
+        originals = ['{}/img/{}/{}.png'.format(self.url, key, i) for i in range(self.results)]
+        return thumbs, originals
+
+    def google_page(self, keyword, start=0, count=None):
+        # start/count serve the paged requests of HttpCollectLinks; a browser gets the first batch and scrolls.
+        thumbs, originals = self.image_urls(keyword)
+        results = range(start, min(start + (count or self.batch), self.results))
+        boxes = ''.join('<div class="bRMDJf islir" data-ri="{0}" onclick="view({0})"><img src="{1}"></div>'
+                        .format(i, thumbs[i]) for i in results)
+        # Same shape as the real payload: a [thumbnail, h, w] entry followed by an [original, h, w] entry.
+        data = [[['https://encrypted-tbn0.gstatic.com/images?q=tbn:{}'.format(i), 180, 180],
+                 [originals[i], self.image_size, self.image_size]] for i in results]
+        return GOOGLE_PAGE.format(keyword=keyword, boxes=boxes, data=json.dumps(data, separators=(',', ':')),
+                                  total=self.results, batch=self.batch, page_delay=int(self.page_delay * 1000),
+                                  button_every=self.button_every, thumbs=json.dumps(thumbs),
+                                  originals=json.dumps(originals))
+
+    def naver_page(self, keyword, start=0, count=None):
+        thumbs, originals = self.image_urls(keyword)
+        results = range(start, min(start + (count or self.batch), self.results))
+        boxes = ''.join('<div class="photo_bx api_ani_send _photoBox" onclick="view({0})">'
+                        '<img class="_image _listImage" src="{1}"></div>'.format(i, thumbs[i]) for i in results)
+        data = {'items': [{'thumb': thumbs[i], 'originalUrl': originals[i]} for i in results]}
+        return NAVER_PAGE.format(keyword=keyword, boxes=boxes, data=json.dumps(data, separators=(',', ':')),
+                                 total=self.results, batch=self.batch, page_delay=int(self.page_delay * 1000),
+                                 thumbs=json.dumps(thumbs), originals=json.dumps(originals))
+
+    def handle(self, request):
+        parts = urlsplit(request.path)
+        query = parse_qs(parts.query)
+        path = parts.path.strip('/').split('/')
+
+        if parts.path == '/search':
+            self.count('pages')
+            time.sleep(self.page_delay)
+            # ijn is the page number of the real paged endpoint, 100 results per page.
+            count = 100 if 'ijn' in query else None
+            page = self.google_page(query.get('q', [''])[0], int(query.get('start', ['0'])[0]), count)
+            return self.send(request, 200, page.encode('utf-8'), 'text/html; charset=utf-8')
+
+        if parts.path == '/search.naver':
+            self.count('pages')
+            time.sleep(self.page_delay)
+            count = int(query['display'][0]) if 'display' in query else None
+            page = self.naver_page(query.get('query', [''])[0], int(query.get('start', ['1'])[0]) - 1, count)
+            return self.send(request, 200, page.encode('utf-8'), 'text/html; charset=utf-8')
+
+        if len(path) == 3 and path[0] in ('img', 'thumb'):
+            # Browsers also load the thumbnails, those are served without latency and errors.
+            if path[0] == 'thumb' and 'Mozilla' in request.headers.get('User-Agent', ''):
+                return self.send(request, 200, make_png('t' + path[1] + path[2], self.thumb_size), 'image/png')
+
+            with self.lock:
+                roll = self.rng.random()
+            time.sleep(self.image_latency)
+
+            if roll < self.throttle_rate:
+                self.count('throttled')
+                return self.send(request, 429, b'', 'text/plain', {'Retry-After': '1'})
+            if roll < self.throttle_rate + self.error_rate:
+                self.count('errors')
+                return self.send(request, 500, b'', 'text/plain')
+
+            size = self.thumb_size if path[0] == 'thumb' else self.image_size
+            body = make_png(path[0][0] + path[1] + path[2], size)
+            self.count('images')
+            self.count('bytes', len(body))
+            return self.send(request, 200, body, 'image/png')
+
+        return self.send(request, 404, b'', 'text/plain')
+
+    @staticmethod
+    def send(request, status, body, content_type, headers=None):
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Google/Naver 이미지 검색을 흉내 내는 로컬 서버를 실행합니다.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--results', type=int, default=200, help='키워드당 검색 결과 수')
+    parser.add_argument('--page-delay', type=float, default=0.2, help='페이지와 추가 결과 로딩 지연(초)')
+    parser.add_argument('--image-latency', type=float, default=0.05, help='이미지 응답 지연(초)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='이미지 요청 중 500 응답 비율')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='이미지 요청 중 429 응답 비율')
+    args = parser.parse_args()
+
+    fake = FakeSearchServer(port=args.port, results=args.results, page_delay=args.page_delay,
+                            image_latency=args.image_latency, error_rate=args.error_rate,
+                            throttle_rate=args.throttle_rate)
+    print('가짜 검색 서버 : {}'.format(fake.search_urls))
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
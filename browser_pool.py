@@ -0,0 +1,219 @@
+import time
+import threading
+import multiprocessing.util
+from contextlib import contextmanager
+from collect_links import CollectLinks
+from metrics import get_metrics
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class BrowserSession:
+    def __init__(self, browser, proxy, startup_time):
+        self.browser = browser
+        self.proxy = proxy
+        self.startup_time = startup_time
+        self.uses = 0
+
+
+class BrowserPool:
+    def __init__(self, no_gui=False, driver_path=None, max_uses=20, max_idle=2, capture_images=False,
+                 profile='default', block_images=False, tabs=1):
+        self.no_gui = no_gui
+        # Windows collecting at once per browser (see tab_pool.TabPool).
+        self.tabs = tabs
+        self.capture_images = capture_images
+        self.profile = profile
+        self.block_images = block_images
+        self.driver_path = driver_path
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+
+        self.idle = []
+        self.lock = threading.Lock()
+        self.stats = {'created': 0, 'leased': 0, 'reused': 0, 'recycled': 0, 'crashed': 0, 'startup_time': 0.0,
+                      'peak_rss': 0}
+
+    def create_session(self, proxy):
+        start = time.time()
+        browser = CollectLinks.create_browser(no_gui=self.no_gui, proxy=proxy, driver_path=self.driver_path,
+                                              capture_images=self.capture_images, profile=self.profile,
+                                              block_images=self.block_images, tabs=self.tabs)
+        startup_time = time.time() - start
+        get_metrics().observe('browser_startup', startup_time)
+
+        with self.lock:
+            self.stats['created'] += 1
+            self.stats['startup_time'] += startup_time
+
+        return BrowserSession(browser, proxy, startup_time)
+
+    @staticmethod
+    def is_alive(session):
+        try:
+            session.browser.execute_script('return 1;')
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def browser_rss(session):
+        # Resident memory of chromedriver and every Chrome process under it, 0 without psutil.
+        if psutil is None:
+            return 0
+        try:
+            process = psutil.Process(session.browser.service.process.pid)
+            total = process.memory_info().rss
+            for child in process.children(recursive=True):
+                total += child.memory_info().rss
+            return total
+        except (AttributeError, psutil.Error):
+            return 0
+
+    @staticmethod
+    def reset(session):
+        browser = session.browser
+        try:
+            browser.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        except Exception:
+            browser.delete_all_cookies()
+
+        old_handles = browser.window_handles
+        browser.execute_script("window.open('about:blank', '_blank');")
+        new_handle = [h for h in browser.window_handles if h not in old_handles][0]
+
+        for handle in old_handles:
+            browser.switch_to.window(handle)
+            browser.close()
+
+        browser.switch_to.window(new_handle)
+
+    def quit_session(self, session):
+        try:
+            session.browser.quit()
+        except Exception as e:
+            print('브라우저 종료 실패 - {}'.format(e))
+
+    def acquire(self, proxy=None):
+        while True:
+            with self.lock:
+                session = None
+                for s in self.idle:
+                    if s.proxy == proxy:
+                        session = s
+                        break
+                if session is not None:
+                    self.idle.remove(session)
+
+            if session is None:
+                session = self.create_session(proxy)
+                break
+
+            if self.is_alive(session):
+                with self.lock:
+                    self.stats['reused'] += 1
+                break
+
+            with self.lock:
+                self.stats['crashed'] += 1
+            self.quit_session(session)
+
+        with self.lock:
+            self.stats['leased'] += 1
+
+        return session
+
+    def release(self, session, healthy=True):
+        session.uses += 1
+
+        # Measured before the reset, while the result page of the task is still loaded.
+        rss = self.browser_rss(session)
+        with self.lock:
+            self.stats['peak_rss'] = max(self.stats['peak_rss'], rss)
+
+        if healthy and session.uses < self.max_uses:
+            try:
+                self.reset(session)
+            except Exception as e:
+                print('브라우저 세션 초기화 실패 - {}'.format(e))
+                healthy = False
+
+            if healthy:
+                # Idle browsers are kept per proxy, the least recently used one makes room for the newest.
+                with self.lock:
+                    self.idle.append(session)
+                    if len(self.idle) <= self.max_idle:
+                        return
+                    session = self.idle.pop(0)
+                    self.stats['recycled'] += 1
+                self.quit_session(session)
+                return
+
+        with self.lock:
+            if not healthy:
+                self.stats['crashed'] += 1
+            else:
+                self.stats['recycled'] += 1
+
+        self.quit_session(session)
+
+    @contextmanager
+    def lease(self, proxy=None, **collect_kwargs):
+        session = self.acquire(proxy)
+        healthy = True
+        try:
+            yield CollectLinks(browser=session.browser, proxy=session.proxy, capture_images=self.capture_images,
+                               profile=self.profile, **collect_kwargs)
+        except Exception:
+            healthy = self.is_alive(session)
+            raise
+        finally:
+            self.release(session, healthy=healthy)
+
+    def idle_proxies(self):
+        # Proxies that already have a browser waiting, so a task can be given one of them without a new launch.
+        with self.lock:
+            return [session.proxy for session in self.idle if session.proxy]
+
+    def report(self):
+        with self.lock:
+            stats = dict(self.stats)
+
+        leased = stats['leased']
+        reuse_rate = stats['reused'] / leased * 100 if leased else 0.0
+        avg_startup = stats['startup_time'] / stats['created'] if stats['created'] else 0.0
+
+        print('브라우저 풀 ({}) - 대여 : {}, 재사용 : {} ({:.1f}%), 생성 : {}, 평균 시작 시간 : {:.2f}s, 교체 : {}, 충돌 : {}, '
+              '최대 브라우저 메모리 : {:.0f}MB'
+              .format(self.profile, leased, stats['reused'], reuse_rate, stats['created'], avg_startup,
+                      stats['recycled'], stats['crashed'], stats['peak_rss'] / 1024 / 1024))
+
+        return stats
+
+    def close(self):
+        with self.lock:
+            sessions = self.idle
+            self.idle = []
+
+        for session in sessions:
+            self.quit_session(session)
+
+        if self.stats['leased'] > 0:
+            self.report()
+
+
+_process_pool = None
+
+
+def get_pool(no_gui=False, driver_path=None, max_uses=20, capture_images=False, profile='default',
+             block_images=False):
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = BrowserPool(no_gui=no_gui, driver_path=driver_path, max_uses=max_uses,
+                                    capture_images=capture_images, profile=profile, block_images=block_images)
+        # Pool workers leave through os._exit, which skips atexit but still runs multiprocessing finalizers.
+        multiprocessing.util.Finalize(None, _process_pool.close, exitpriority=10)
+    return _process_pool
@@ -2,17 +2,138 @@ import time
 from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import ElementNotVisibleException, StaleElementReferenceException
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
 import platform
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 from webdriver_manager.chrome import ChromeDriverManager
 import os.path as osp
+from full_res_resolver import google_original_urls, naver_original_urls
+from rate_limiter import RateLimiter
+from metrics import get_metrics
+from devtools_capture import ResponseCapture
+
+
+class CaptchaDetected(Exception):
+    pass
+
+
+_driver_path = None
+
+
+def resolve_driver_path():
+    global _driver_path
+    if _driver_path is None:
+        _driver_path = ChromeDriverManager().install()
+    return _driver_path
 
 
 class CollectLinks:
-    def __init__(self, no_gui=False, proxy=None):
+    GOOGLE_GRID = '//div[@class="bRMDJf islir"]'
+    NAVER_GRID = '//div[@class="photo_bx api_ani_send _photoBox"]//img[@class="_image _listImage"]'
+
+    # Bulk extraction: one script call returns [element count, srcs of elements from arguments[1] on] instead of a
+    # WebDriver round trip per attribute.
+    GOOGLE_EXTRACT_SCRIPT = """
+        var boxes = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var srcs = [];
+        for (var i = arguments[1]; i < boxes.snapshotLength; i++) {
+            var imgs = boxes.snapshotItem(i).getElementsByTagName('img');
+            for (var j = 0; j < imgs.length; j++) {
+                var src = imgs[j].src;
+                if (!src || src.indexOf('data:') === 0) {
+                    src = imgs[j].getAttribute('data-iurl');
+                }
+                srcs.push(src);
+            }
+        }
+        return [boxes.snapshotLength, srcs];
+    """
+    SRC_EXTRACT_SCRIPT = """
+        var imgs = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var srcs = [];
+        for (var i = arguments[1]; i < imgs.snapshotLength; i++) {
+            var src = imgs.snapshotItem(i).src;
+            if (src) {
+                srcs.push(src);
+            }
+        }
+        return [imgs.snapshotLength, srcs];
+    """
+
+    SEARCH_URLS = {
+        'google': 'https://www.google.com/search',
+        'naver': 'https://search.naver.com/search.naver',
+    }
+
+    CAPTCHA_XPATH = '//form[@id="captcha-form"] | //div[contains(@class, "g-recaptcha")] | //div[@id="recaptcha"]'
+
+    # Lean profile: only the markup and scripts of the result pages are needed to read the links, so fonts, styles,
+    # media and trackers are never fetched, caches are kept tiny and renderer memory is capped. Images are blocked as
+    # well unless they are needed (full resolution viewers and --capture-images wait for them to load).
+    PROFILES = ('default', 'lean')
+    LEAN_ARGUMENTS = ('--disable-extensions', '--disable-gpu', '--disable-remote-fonts', '--mute-audio',
+                      '--disable-background-networking', '--disable-component-update', '--disable-default-apps',
+                      '--disable-sync', '--no-first-run', '--disk-cache-size=1048576', '--media-cache-size=1048576',
+                      '--renderer-process-limit=2', '--js-flags=--max-old-space-size=256')
+    LEAN_CONTENT_SETTINGS = {
+        'profile.managed_default_content_settings.stylesheets': 2,
+        'profile.managed_default_content_settings.plugins': 2,
+        'profile.managed_default_content_settings.popups': 2,
+        'profile.managed_default_content_settings.geolocation': 2,
+        'profile.managed_default_content_settings.notifications': 2,
+        'profile.managed_default_content_settings.media_stream': 2,
+    }
+    LEAN_BLOCKED_URLS = ['*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*.mp4', '*.webm', '*.m3u8',
+                         '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                         '*googlesyndication.com*', '*adservice.google.*', '*/gen_204*', '*/log?format=*',
+                         '*siape.veta.naver.com*', '*lcs.naver.com*', '*nlog.naver.com*']
+
+    # Several windows of one Chrome collecting at once (--tabs): the windows in the background must keep running
+    # their timers and lazy loading while another one is being driven.
+    TAB_ARGUMENTS = ('--disable-background-timer-throttling', '--disable-backgrounding-occluded-windows',
+                     '--disable-renderer-backgrounding')
+
+    POLL_INTERVAL = 0.1
+    STALL_TIMEOUT = 3.0
+    FULL_STALL_TIMEOUT = 10.0
+    LOADING_TIMEOUT = 5.0
+
+    def __init__(self, no_gui=False, proxy=None, browser=None, driver_path=None, batch_extract=True,
+                 debug_highlight=False, bulk_resolve=True, rate_limiter=None, search_urls=None, capture_images=False,
+                 profile='default', block_images=False, proxy_pool=None):
+        self.rate_limiter = rate_limiter
+        # Page loads are reported to the proxy pool; with a pooled browser proxy is the one it was started with.
+        self.proxy = proxy
+        self.proxy_pool = proxy_pool
+        # Overridable so a local fake search server can stand in for the live sites (see benchmarks/).
+        self.search_urls = dict(self.SEARCH_URLS, **(search_urls or {}))
+        self.batch_extract = batch_extract
+        self.bulk_resolve = bulk_resolve
+        self.debug_highlight = debug_highlight
+        # Set when the last collection stopped at its limit, or on errors, rather than at the end of the results.
+        self.truncated = False
+
+        if browser is not None:
+            self.browser = browser
+            self.owns_browser = False
+        else:
+            self.browser = self.create_browser(no_gui=no_gui, proxy=proxy, driver_path=driver_path,
+                                               capture_images=capture_images, profile=profile,
+                                               block_images=block_images)
+            self.owns_browser = True
+
+        if profile == 'lean':
+            self.block_requests()
+
+        # A leased browser must have been created with capture_images=True as well, the log is set up at launch.
+        self.capture = ResponseCapture(self.browser) if capture_images else None
+
+    @staticmethod
+    def create_browser(no_gui=False, proxy=None, driver_path=None, capture_images=False, profile='default',
+                       block_images=False, tabs=1):
         executable = ''
 
         if platform.system() == 'Windows':
@@ -37,18 +158,35 @@ class CollectLinks:
             chrome_options.add_argument('--headless')
         if proxy:
             chrome_options.add_argument("--proxy-server={}".format(proxy))
-        self.browser = webdriver.Chrome(ChromeDriverManager().install(), chrome_options=chrome_options)
+        if tabs > 1:
+            for argument in CollectLinks.TAB_ARGUMENTS:
+                chrome_options.add_argument(argument)
+        capabilities = DesiredCapabilities.CHROME.copy()
+        if profile == 'lean':
+            for argument in CollectLinks.LEAN_ARGUMENTS:
+                chrome_options.add_argument(argument)
+            prefs = dict(CollectLinks.LEAN_CONTENT_SETTINGS)
+            if block_images and not capture_images:
+                prefs['profile.managed_default_content_settings.images'] = 2
+                chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+            chrome_options.add_experimental_option('prefs', prefs)
+            # get() returns at DOMContentLoaded, the grids are waited for explicitly anyway.
+            capabilities['pageLoadStrategy'] = 'eager'
+        if capture_images:
+            ResponseCapture.enable(chrome_options, capabilities)
+        browser = webdriver.Chrome(driver_path or resolve_driver_path(), chrome_options=chrome_options,
+                                   desired_capabilities=capabilities)
 
         browser_version = '버전 감지 실패함'
         chromedriver_version = '버전 감지 실패함'
         major_version_different = False
 
-        if 'browserVersion' in self.browser.capabilities:
-            browser_version = str(self.browser.capabilities['browserVersion'])
+        if 'browserVersion' in browser.capabilities:
+            browser_version = str(browser.capabilities['browserVersion'])
 
-        if 'chrome' in self.browser.capabilities:
-            if 'chromedriverVersion' in self.browser.capabilities['chrome']:
-                chromedriver_version = str(self.browser.capabilities['chrome']['chromedriverVersion']).split(' ')[0]
+        if 'chrome' in browser.capabilities:
+            if 'chromedriverVersion' in browser.capabilities['chrome']:
+                chromedriver_version = str(browser.capabilities['chrome']['chromedriverVersion']).split(' ')[0]
 
         if browser_version.split('.')[0] != chromedriver_version.split('.')[0]:
             major_version_different = True
@@ -62,26 +200,125 @@ class CollectLinks:
                 '"http://chromedriver.chromium.org/downloads"에서 올바른 버전을 다운로드하고 "./chromedriver"에 배치합니다.')
         print('_________________________________')
 
+        return browser
+
+    def block_requests(self):
+        # Request blocking lives in the DevTools session of the tab, and a pooled browser gets a new tab per lease.
+        try:
+            self.browser.execute_cdp_cmd('Network.enable', {})
+            self.browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.LEAN_BLOCKED_URLS})
+        except Exception as e:
+            print('요청 차단 설정 실패 - {}'.format(e))
+
+    def finish(self):
+        if self.owns_browser:
+            self.browser.quit()
+
+    def pause(self, seconds):
+        # Every wait of the collection goes through here, so a tab sharing its browser can hand it over meanwhile.
+        time.sleep(seconds)
+
     def get_scroll(self):
         pos = self.browser.execute_script("return window.pageYOffset;")
         return pos
 
+    def wait_clickable(self, xpath, timeout=15):
+        return WebDriverWait(self.browser, timeout).until(EC.element_to_be_clickable((By.XPATH, xpath)))
+
     def wait_and_click(self, xpath):
         try:
-            w = WebDriverWait(self.browser, 15)
-            elem = w.until(EC.element_to_be_clickable((By.XPATH, xpath)))
+            elem = self.wait_clickable(xpath)
             elem.click()
             self.highlight(elem)
         except Exception as e:
             print('클릭 시간 초과 - {}'.format(xpath))
             print('브라우저 새로고침 중 . .')
             self.browser.refresh()
-            time.sleep(2)
+            self.pause(2)
             return self.wait_and_click(xpath)
 
         return elem
 
+    def throttle(self, url):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(RateLimiter.PAGE, url)
+
+    def open(self, url):
+        self.throttle(url)
+
+        start = time.time()
+        with get_metrics().timer('page_load'):
+            self.browser.get(url)
+        latency = time.time() - start
+
+        # Chrome shows its own error page when the proxy (or the network) fails instead of raising.
+        failed = str(self.browser.current_url).startswith('chrome-error://')
+        blocked = not failed and self.is_blocked()
+        if self.proxy_pool is not None and self.proxy:
+            self.proxy_pool.report(self.proxy, ok=not (failed or blocked), latency=latency)
+        if failed:
+            raise ConnectionError('페이지를 열 수 없습니다 : {}'.format(url))
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.report(RateLimiter.PAGE, url, throttled=blocked, reason='captcha')
+        if blocked:
+            raise CaptchaDetected('캡차 페이지 감지 : {}'.format(self.browser.current_url))
+
+    def is_blocked(self):
+        url = str(self.browser.current_url).lower()
+        if '/sorry/' in url or 'captcha' in url:
+            return True
+        return len(self.browser.find_elements(By.XPATH, self.CAPTCHA_XPATH)) > 0
+
+    def wait_for(self, xpath, timeout=10):
+        try:
+            WebDriverWait(self.browser, timeout).until(EC.presence_of_element_located((By.XPATH, xpath)))
+            return True
+        except TimeoutException:
+            return False
+
+    def count_elements(self, xpath):
+        return self.browser.execute_script(
+            "return document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null)"
+            ".snapshotLength;", xpath)
+
+    def iter_scroll(self, xpath, limit=0, on_stall=None, max_stall_actions=2):
+        # Scrolls to the bottom until the number of elements matching xpath stops growing for STALL_TIMEOUT seconds or
+        # reaches limit. Yields the element count every time the result grid grows.
+        count = self.count_elements(xpath)
+        yield count
+        last_growth = time.time()
+        stall_actions = 0
+
+        while not (limit and count >= limit):
+            self.browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            self.pause(self.POLL_INTERVAL)
+
+            new_count = self.count_elements(xpath)
+            if new_count > count:
+                get_metrics().observe('scroll', time.time() - last_growth)
+                count = new_count
+                yield count
+                # Measured after the consumer resumes us, so backpressure downstream is not mistaken for a stall.
+                last_growth = time.time()
+            elif time.time() - last_growth > self.STALL_TIMEOUT:
+                if on_stall is None or stall_actions >= max_stall_actions or not on_stall():
+                    break
+                stall_actions += 1
+                last_growth = time.time()
+
+        self.truncated = bool(limit and count >= limit)
+
+    def google_show_more(self):
+        buttons = [b for b in self.browser.find_elements(By.XPATH, '//input[@type="button"]') if b.is_displayed()]
+        if not buttons:
+            return False
+        buttons[0].click()
+        return True
+
     def highlight(self, element):
+        if not self.debug_highlight:
+            return
         self.browser.execute_script("arguments[0].setAttribute('style', arguments[1]);", element,
                                     "background: yellow; border: 2px solid red;")
 
@@ -89,36 +326,28 @@ class CollectLinks:
     def remove_duplicates(_list):
         return list(dict.fromkeys(_list))
 
-    def google(self, keyword, add_url=""):
-        self.browser.get("https://www.google.com/search?q={}&source=lnms&tbm=isch{}".format(keyword, add_url))
+    def google(self, keyword, add_url="", limit=0):
+        return list(self.iter_google(keyword, add_url, limit=limit))
 
-        time.sleep(1)
+    def naver(self, keyword, add_url="", limit=0):
+        return list(self.iter_naver(keyword, add_url, limit=limit))
 
-        print('정보 수집 중 . . .')
+    def google_full(self, keyword, add_url="", limit=0):
+        return list(self.iter_google_full(keyword, add_url, limit=limit))
 
-        elem = self.browser.find_element_by_tag_name("body")
+    def naver_full(self, keyword, add_url="", limit=0):
+        return list(self.iter_naver_full(keyword, add_url, limit=limit))
 
-        for i in range(60):
-            elem.send_keys(Keys.PAGE_DOWN)
-            time.sleep(0.2)
+    def google_links(self, seen, start=0):
+        if self.batch_extract:
+            n_boxes, srcs = self.browser.execute_script(self.GOOGLE_EXTRACT_SCRIPT, self.GOOGLE_GRID, start)
+            return self.new_links(srcs, seen), n_boxes
 
-        try:
-            self.wait_and_click('//input[@type="button"]')
-
-            for i in range(60):
-                elem.send_keys(Keys.PAGE_DOWN)
-                time.sleep(0.2)
-
-        except ElementNotVisibleException:
-            pass
-
-        photo_grid_boxes = self.browser.find_elements(By.XPATH, '//div[@class="bRMDJf islir"]')
-
-        print('링크 정보 수집 중')
+        photo_grid_boxes = self.browser.find_elements(By.XPATH, self.GOOGLE_GRID)
 
         links = []
 
-        for box in photo_grid_boxes:
+        for box in photo_grid_boxes[start:]:
             try:
                 imgs = box.find_elements(By.TAG_NAME, 'img')
 
@@ -126,178 +355,265 @@ class CollectLinks:
                     src = img.get_attribute("src")
                     if str(src).startswith('data:'):
                         src = img.get_attribute("data-iurl")
-                    links.append(src)
+                    if src not in seen:
+                        seen.add(src)
+                        links.append(src)
 
             except Exception as e:
                 print('[Google에서 링크를 수집하는 동안 예외가 발생했습니다.] {}'.format(e))
 
-        links = self.remove_duplicates(links)
-
-        print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('google', keyword, len(links)))
-        self.browser.close()
-
-        return links
-
-    def naver(self, keyword, add_url=""):
-        self.browser.get(
-            "https://search.naver.com/search.naver?where=image&sm=tab_jum&query={}{}".format(keyword, add_url))
-
-        time.sleep(1)
-
-        print('정보 수집 중 . . .')
-
-        elem = self.browser.find_element_by_tag_name("body")
-
-        for i in range(60):
-            elem.send_keys(Keys.PAGE_DOWN)
-            time.sleep(0.2)
+        return links, len(photo_grid_boxes)
 
-        imgs = self.browser.find_elements(By.XPATH,
-                                          '//div[@class="photo_bx api_ani_send _photoBox"]//img[@class="_image _listImage"]')
+    def naver_links(self, seen, start=0):
+        if self.batch_extract:
+            n_imgs, srcs = self.browser.execute_script(self.SRC_EXTRACT_SCRIPT, self.NAVER_GRID, start)
+            return self.new_links([src for src in srcs if src[0] != 'd'], seen), n_imgs
 
-        print('정보 수집 중 . . .')
+        imgs = self.browser.find_elements(By.XPATH, self.NAVER_GRID)
 
         links = []
 
-        for img in imgs:
+        for img in imgs[start:]:
             try:
                 src = img.get_attribute("src")
-                if src[0] != 'd':
+                if src[0] != 'd' and src not in seen:
+                    seen.add(src)
                     links.append(src)
             except Exception as e:
                 print('[Naver에서 링크를 수집하는 동안 예외가 발생했습니다. ] {}'.format(e))
 
-        links = self.remove_duplicates(links)
+        return links, len(imgs)
 
-        print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('naver', keyword, len(links)))
-        self.browser.close()
-
-        return links
-
-    def google_full(self, keyword, add_url=""):
-        print('[전체 해상도 모드]')
-
-        self.browser.get("https://www.google.com/search?q={}&tbm=isch{}".format(keyword, add_url))
-        time.sleep(1)
-
-        elem = self.browser.find_element_by_tag_name("body")
-
-        print('정보 수집 중 . . .')
-
-        self.wait_and_click('//div[@data-ri="0"]')
-        time.sleep(1)
+    def captured_first(self, links, held):
+        # With capture on, links are held back for one scroll step so Chrome has loaded the thumbnails (and their
+        # bodies are in the capture) by the time the download stage asks for them.
+        if self.capture is None:
+            return links
+        self.capture.poll()
+        ready = held[:]
+        held[:] = links
+        return ready
 
+    @staticmethod
+    def new_links(srcs, seen):
         links = []
-        count = 1
-
-        last_scroll = 0
-        scroll_patience = 0
-
-        while True:
-            try:
-                xpath = '//div[@id="islsp"]//div[@class="v4dQwb"]'
-                div_box = self.browser.find_element(By.XPATH, xpath)
-                self.highlight(div_box)
-
-                xpath = '//img[@class="n3VNCb"]'
-                img = div_box.find_element(By.XPATH, xpath)
-                self.highlight(img)
-
-                xpath = '//div[@class="k7O2sd"]'
-                loading_bar = div_box.find_element(By.XPATH, xpath)
+        for src in srcs:
+            if src and src not in seen:
+                seen.add(src)
+                links.append(src)
+        return links
 
-                while str(loading_bar.get_attribute('style')) != 'display: none;':
-                    time.sleep(0.1)
+    def iter_google(self, keyword, add_url="", limit=0):
+        seen = set()
+        n_boxes = 0
 
-                src = img.get_attribute('src')
+        try:
+            self.open("{}?q={}&source=lnms&tbm=isch{}".format(self.search_urls['google'], keyword, add_url))
+            self.wait_for(self.GOOGLE_GRID)
 
-                if src is not None:
-                    links.append(src)
-                    print('%d: %s' % (count, src))
-                    count += 1
+            print('정보 수집 중 . . .')
 
-            except StaleElementReferenceException:
-                pass
-            except Exception as e:
-                print('[google_full에서 링크를 수집하는 동안 예외가 발생했습니다.] {}'.format(e))
+            held = []
+            for count in self.iter_scroll(self.GOOGLE_GRID, limit=limit, on_stall=self.google_show_more):
+                with get_metrics().timer('extract'):
+                    links, n_boxes = self.google_links(seen, start=n_boxes)
+                yield from self.captured_first(links, held)
+            yield from self.captured_first([], held)
 
-            scroll = self.get_scroll()
-            if scroll == last_scroll:
-                scroll_patience += 1
-            else:
-                scroll_patience = 0
-                last_scroll = scroll
+            print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('google', keyword, len(seen)))
+        finally:
+            self.finish()
 
-            if scroll_patience >= 30:
-                break
+    def iter_naver(self, keyword, add_url="", limit=0):
+        seen = set()
+        n_imgs = 0
 
-            elem.send_keys(Keys.RIGHT)
+        try:
+            self.open("{}?where=image&sm=tab_jum&query={}{}".format(self.search_urls['naver'], keyword, add_url))
+            self.wait_for(self.NAVER_GRID)
 
-        links = self.remove_duplicates(links)
+            print('정보 수집 중 . . .')
 
-        print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('google_full', keyword, len(links)))
-        self.browser.close()
+            held = []
+            for count in self.iter_scroll(self.NAVER_GRID, limit=limit):
+                with get_metrics().timer('extract'):
+                    links, n_imgs = self.naver_links(seen, start=n_imgs)
+                yield from self.captured_first(links, held)
+            yield from self.captured_first([], held)
 
-        return links
+            print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('naver', keyword, len(seen)))
+        finally:
+            self.finish()
 
-    def naver_full(self, keyword, add_url=""):
+    def iter_google_full(self, keyword, add_url="", limit=0):
         print('[전체 해상도 모드]')
 
-        self.browser.get(
-            "https://search.naver.com/search.naver?where=image&sm=tab_jum&query={}{}".format(keyword, add_url))
-        time.sleep(1)
-
-        elem = self.browser.find_element_by_tag_name("body")
-
-        print('정보 수집 중 . .')
-
-        self.wait_and_click('//div[@class="photo_bx api_ani_send _photoBox"]')
-        time.sleep(1)
+        seen = set()
 
-        links = []
-        count = 1
+        try:
+            self.open("{}?q={}&tbm=isch{}".format(self.search_urls['google'], keyword, add_url))
+            self.wait_for(self.GOOGLE_GRID)
+
+            elem = self.browser.find_element_by_tag_name("body")
+
+            print('정보 수집 중 . . .')
+
+            if self.bulk_resolve:
+                with get_metrics().timer('resolve'):
+                    originals = google_original_urls(self.browser.page_source)
+
+                for src in self.new_links(originals, seen):
+                    print('%d: %s' % (len(seen), src))
+                    yield src
+                    if limit and len(seen) >= limit:
+                        break
+
+                if limit and len(seen) >= limit:
+                    self.truncated = True
+                    return
+
+                # The page only embeds the first batch of results; walk the viewer for the rest, from the first result
+                # past the batch. The grid is scrolled until that result is there, unless the results end before.
+                print('일괄 해석 : {}개, 나머지는 뷰어에서 수집합니다.'.format(len(seen)))
+                for n in self.iter_scroll(self.GOOGLE_GRID, limit=len(seen) + 1, on_stall=self.google_show_more):
+                    pass
+                if self.count_elements(self.GOOGLE_GRID) <= len(seen):
+                    self.truncated = False
+                    print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('google_full', keyword, len(seen)))
+                    return
+
+            self.wait_and_click('//div[@data-ri="{}"]'.format(len(seen)))
+            self.pause(1)
+
+            count = len(seen) + 1
+            last_growth = time.time()
+            last_error = 0
+
+            while not (limit and len(seen) >= limit):
+                try:
+                    xpath = '//div[@id="islsp"]//div[@class="v4dQwb"]'
+                    div_box = self.browser.find_element(By.XPATH, xpath)
+                    self.highlight(div_box)
+
+                    xpath = '//img[@class="n3VNCb"]'
+                    img = div_box.find_element(By.XPATH, xpath)
+                    self.highlight(img)
 
-        last_scroll = 0
-        scroll_patience = 0
+                    xpath = '//div[@class="k7O2sd"]'
+                    loading_bar = div_box.find_element(By.XPATH, xpath)
 
-        while True:
-            try:
-                xpath = '//div[@class="image _imageBox"]/img[@class="_image"]'
-                imgs = self.browser.find_elements(By.XPATH, xpath)
+                    loading_deadline = time.time() + self.LOADING_TIMEOUT
+                    while str(loading_bar.get_attribute('style')) != 'display: none;' \
+                            and time.time() < loading_deadline:
+                        self.pause(self.POLL_INTERVAL)
 
-                for img in imgs:
-                    self.highlight(img)
                     src = img.get_attribute('src')
 
-                    if src not in links and src is not None:
-                        links.append(src)
+                    if src is not None and src not in seen:
+                        if self.capture is not None:
+                            self.capture.poll()
+                        seen.add(src)
                         print('%d: %s' % (count, src))
                         count += 1
+                        last_growth = time.time()
+                        yield src
 
-            except StaleElementReferenceException:
-                pass
-            except Exception as e:
-                print('[naver_full에서 링크를 수집하는 중 예외가 발생했습니다.] {}'.format(e))
+                except StaleElementReferenceException:
+                    pass
+                except Exception as e:
+                    print('[google_full에서 링크를 수집하는 동안 예외가 발생했습니다.] {}'.format(e))
+                    last_error = time.time()
 
-            scroll = self.get_scroll()
-            if scroll == last_scroll:
-                scroll_patience += 1
-            else:
-                scroll_patience = 0
-                last_scroll = scroll
+                if time.time() - last_growth > self.FULL_STALL_TIMEOUT:
+                    break
 
-            if scroll_patience >= 100:
-                break
+                elem.send_keys(Keys.RIGHT)
 
-            elem.send_keys(Keys.RIGHT)
-            elem.send_keys(Keys.PAGE_DOWN)
+            # Errors since the last new link: the viewer broke down, the results did not necessarily end.
+            self.truncated = bool(limit and len(seen) >= limit) or last_error > last_growth
+            print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('google_full', keyword, len(seen)))
+        finally:
+            self.finish()
 
-        links = self.remove_duplicates(links)
+    def iter_naver_full(self, keyword, add_url="", limit=0):
+        print('[전체 해상도 모드]')
 
-        print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('naver_full', keyword, len(links)))
-        self.browser.close()
+        seen = set()
 
-        return links
+        try:
+            self.open("{}?where=image&sm=tab_jum&query={}{}".format(self.search_urls['naver'], keyword, add_url))
+            self.wait_for(self.NAVER_GRID)
+
+            elem = self.browser.find_element_by_tag_name("body")
+
+            print('정보 수집 중 . .')
+
+            if self.bulk_resolve:
+                # Naver thumbnails carry the original URL in their src query, so the whole grid resolves while it
+                # scrolls and the viewer is only needed when nothing could be resolved.
+                with get_metrics().timer('resolve'):
+                    originals = naver_original_urls(self.browser.page_source)
+
+                for src in self.new_links(originals, seen):
+                    yield src
+
+                n_imgs = 0
+                for n in self.iter_scroll(self.NAVER_GRID, limit=limit):
+                    with get_metrics().timer('extract'):
+                        n_imgs, thumbnails = self.browser.execute_script(self.SRC_EXTRACT_SCRIPT, self.NAVER_GRID,
+                                                                         n_imgs)
+                    for src in self.new_links(naver_original_urls('', thumbnails), seen):
+                        yield src
+
+                if seen:
+                    print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('naver_full', keyword, len(seen)))
+                    return
+
+            self.wait_and_click('//div[@class="photo_bx api_ani_send _photoBox"]')
+            self.pause(1)
+
+            count = 1
+            last_growth = time.time()
+            last_error = 0
+
+            while not (limit and len(seen) >= limit):
+                try:
+                    xpath = '//div[@class="image _imageBox"]/img[@class="_image"]'
+                    if self.batch_extract:
+                        srcs = self.browser.execute_script(self.SRC_EXTRACT_SCRIPT, xpath, 0)[1]
+                    else:
+                        srcs = []
+                        for img in self.browser.find_elements(By.XPATH, xpath):
+                            self.highlight(img)
+                            srcs.append(img.get_attribute('src'))
+
+                    if self.capture is not None:
+                        self.capture.poll()
+
+                    for src in srcs:
+                        if src is not None and src not in seen:
+                            seen.add(src)
+                            print('%d: %s' % (count, src))
+                            count += 1
+                            last_growth = time.time()
+                            yield src
+
+                except StaleElementReferenceException:
+                    pass
+                except Exception as e:
+                    print('[naver_full에서 링크를 수집하는 중 예외가 발생했습니다.] {}'.format(e))
+                    last_error = time.time()
+
+                if time.time() - last_growth > self.FULL_STALL_TIMEOUT:
+                    break
+
+                elem.send_keys(Keys.RIGHT)
+                elem.send_keys(Keys.PAGE_DOWN)
+
+            self.truncated = bool(limit and len(seen) >= limit) or last_error > last_growth
+            print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format('naver_full', keyword, len(seen)))
+        finally:
+            self.finish()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,181 @@
+import io
+import os
+import hashlib
+import sqlite3
+import threading
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class ContentIndex:
+    # Near duplicates are found through four 16 bit bands of a 64 bit dHash. Two hashes within distance 3 always
+    # share at least one band, so every band lookup hits an index instead of scanning the table.
+    N_BANDS = 4
+
+    def __init__(self, path, max_distance=3, exists=None):
+        self.path = path
+        self.max_distance = max_distance
+        # Tells whether a stored copy is still there; stored paths are not plain files with the packed output.
+        self.exists = exists or os.path.exists
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS content (
+                sha256 TEXT PRIMARY KEY,
+                phash INTEGER,
+                band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER,
+                path TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS content_band0 ON content (band0);
+            CREATE INDEX IF NOT EXISTS content_band1 ON content (band1);
+            CREATE INDEX IF NOT EXISTS content_band2 ON content (band2);
+            CREATE INDEX IF NOT EXISTS content_band3 ON content (band3);
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS placements (
+                sha256 TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                PRIMARY KEY (sha256, directory)
+            ) WITHOUT ROWID;
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def sha256(data):
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def perceptual_hash(source):
+        if Image is None:
+            return None
+
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                source = io.BytesIO(source)
+            image = Image.open(source).convert('L').resize((9, 8))
+        except Exception:
+            return None
+
+        pixels = list(image.getdata())
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+
+        # SQLite integers are signed 64 bit.
+        return value - (1 << 64) if value >= (1 << 63) else value
+
+    @classmethod
+    def bands(cls, phash):
+        if phash is None:
+            return [None] * cls.N_BANDS
+        value = phash & 0xFFFFFFFFFFFFFFFF
+        return [(value >> (16 * i)) & 0xFFFF for i in range(cls.N_BANDS)]
+
+    @staticmethod
+    def distance(a, b):
+        return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+    # Lookups return (sha256, path) of the stored copy, or None.
+    def find_url(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT c.sha256, c.path FROM urls u JOIN content c ON c.sha256 = u.sha256 '
+                                    'WHERE u.url = ?', (url,)).fetchone()
+
+        if row is None or not self.exists(row[1]):
+            return None
+        return row
+
+    def find(self, digest, phash=None):
+        with self.lock:
+            row = self.conn.execute('SELECT sha256, path FROM content WHERE sha256 = ?', (digest,)).fetchone()
+            if row is not None and self.exists(row[1]):
+                return row
+
+            if phash is None:
+                return None
+
+            bands = self.bands(phash)
+            candidates = self.conn.execute('SELECT sha256, phash, path FROM content '
+                                           'WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?', bands).fetchall()
+
+        for other_digest, other, path in candidates:
+            if other is not None and self.distance(phash, other) <= self.max_distance and self.exists(path):
+                return other_digest, path
+
+        return None
+
+    def add(self, digest, phash, path, url=None, directory=None):
+        # Returns the path already registered for this content when another worker got there first. directory is
+        # where the copy counts as placed, by default the directory of path.
+        with self.lock:
+            cursor = self.conn.execute('INSERT OR IGNORE INTO content (sha256, phash, band0, band1, band2, band3, path) '
+                                       'VALUES (?, ?, ?, ?, ?, ?, ?)', [digest, phash] + self.bands(phash) + [path])
+            if cursor.rowcount == 0:
+                row = self.conn.execute('SELECT path FROM content WHERE sha256 = ?', (digest,)).fetchone()
+                if self.exists(row[0]) and os.path.abspath(row[0]) != os.path.abspath(path):
+                    existing = row[0]
+                else:
+                    self.conn.execute('UPDATE content SET path = ? WHERE sha256 = ?', (path, digest))
+                    existing = None
+            else:
+                existing = None
+
+            if url is not None:
+                self.conn.execute('INSERT OR REPLACE INTO urls (url, sha256) VALUES (?, ?)', (url, digest))
+            if existing is None:
+                self.conn.execute('INSERT OR IGNORE INTO placements (sha256, directory) VALUES (?, ?)',
+                                  (digest, os.path.abspath(directory or os.path.dirname(path))))
+            self.conn.commit()
+
+        return existing
+
+    def place(self, digest, directory):
+        # True if this content has not been stored in the directory yet.
+        with self.lock:
+            cursor = self.conn.execute('INSERT OR IGNORE INTO placements (sha256, directory) VALUES (?, ?)',
+                                       (digest, os.path.abspath(directory)))
+            self.conn.commit()
+        return cursor.rowcount == 1
+
+    def forget(self, files, directory):
+        # Drops what a reset task stored in directory, [(path, sha256)], so a new run stores it again instead of
+        # taking it for a duplicate: its own copies with their URLs, and the placements of everything it stored.
+        with self.lock:
+            for path, digest in files:
+                if digest is None:
+                    continue
+                cursor = self.conn.execute('DELETE FROM content WHERE sha256 = ? AND path = ?', (digest, path))
+                if cursor.rowcount:
+                    self.conn.execute('DELETE FROM urls WHERE sha256 = ?', (digest,))
+                self.conn.execute('DELETE FROM placements WHERE sha256 = ? AND directory = ?',
+                                  (digest, os.path.abspath(directory)))
+            self.conn.commit()
+
+    def add_url(self, url, digest):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO urls (url, sha256) VALUES (?, ?)', (url, digest))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_process_indexes = {}
+
+
+def get_index(path, max_distance=3, exists=None):
+    # Keyed by pid as well: a SQLite connection must not be shared with forked workers.
+    key = (path, os.getpid())
+    if key not in _process_indexes:
+        _process_indexes[key] = ContentIndex(path, max_distance=max_distance, exists=exists)
+    return _process_indexes[key]
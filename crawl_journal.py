@@ -0,0 +1,181 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+class CrawlJournal:
+    PENDING = 'pending'
+    OK = 'ok'
+    INVALID = 'invalid'
+    DUPLICATE = 'duplicate'
+    REJECTED = 'rejected'
+    FAILED = 'failed'
+
+    COLLECTING = 'collecting'
+    COLLECTED = 'collected'
+    DONE = 'done'
+
+    def __init__(self, path, max_retries=3):
+        self.path = path
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                keyword TEXT NOT NULL,
+                site TEXT NOT NULL,
+                state TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (keyword, site)
+            );
+            CREATE TABLE IF NOT EXISTS links (
+                keyword TEXT NOT NULL,
+                site TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                state TEXT NOT NULL,
+                retries INTEGER NOT NULL DEFAULT 0,
+                path TEXT,
+                PRIMARY KEY (keyword, site, idx),
+                UNIQUE (keyword, site, url)
+            );
+            CREATE TABLE IF NOT EXISTS index_floors (
+                keyword TEXT NOT NULL,
+                site TEXT NOT NULL,
+                floor INTEGER NOT NULL,
+                PRIMARY KEY (keyword, site)
+            );
+        ''')
+        # HTTP validators of every stored image, for conditional requests in a delta recrawl, and the reason a link
+        # was rejected by the quality filter. Added to journals written by older versions in place.
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(links)')]
+        for column in ('etag', 'last_modified', 'reason'):
+            if column not in columns:
+                self.conn.execute('ALTER TABLE links ADD COLUMN {} TEXT'.format(column))
+        # The limit a task's links were collected up to, 0 once they are all the results there are.
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(tasks)')]
+        if 'link_limit' not in columns:
+            self.conn.execute('ALTER TABLE tasks ADD COLUMN link_limit INTEGER')
+        self.conn.commit()
+
+    def done_tasks(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT keyword, site FROM tasks WHERE state = ?', (self.DONE,)).fetchall()
+        return set(rows)
+
+    def task_state(self, keyword, site):
+        with self.lock:
+            row = self.conn.execute('SELECT state FROM tasks WHERE keyword = ? AND site = ?',
+                                    (keyword, site)).fetchone()
+        return row[0] if row else None
+
+    def set_task_state(self, keyword, site, state, link_limit=None):
+        # link_limit is kept as it was when not given.
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO tasks (keyword, site, state, updated, link_limit) '
+                              'VALUES (?, ?, ?, ?, COALESCE(?, (SELECT link_limit FROM tasks '
+                              'WHERE keyword = ? AND site = ?)))',
+                              (keyword, site, state, time.time(), link_limit, keyword, site))
+            self.conn.commit()
+
+    def link_limit(self, keyword, site):
+        # None for a task collected by an older version, whose links may or may not have been cut off.
+        with self.lock:
+            row = self.conn.execute('SELECT link_limit FROM tasks WHERE keyword = ? AND site = ?',
+                                    (keyword, site)).fetchone()
+        return row[0] if row else None
+
+    def reset_task(self, keyword, site):
+        with self.lock:
+            self.conn.execute('DELETE FROM links WHERE keyword = ? AND site = ?', (keyword, site))
+            self.conn.execute('DELETE FROM tasks WHERE keyword = ? AND site = ?', (keyword, site))
+            self.conn.execute('DELETE FROM index_floors WHERE keyword = ? AND site = ?', (keyword, site))
+            self.conn.commit()
+
+    def set_index_floor(self, keyword, site, floor):
+        # New links are numbered from floor on, so files stored before the journal existed are not overwritten.
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO index_floors (keyword, site, floor) VALUES (?, ?, ?)',
+                              (keyword, site, floor))
+            self.conn.commit()
+
+    def insert_link(self, keyword, site, url):
+        self.conn.execute('INSERT OR IGNORE INTO links (keyword, site, idx, url, state) '
+                          'SELECT ?, ?, MAX(COALESCE(MAX(idx) + 1, 0), COALESCE((SELECT floor FROM index_floors '
+                          'WHERE keyword = ? AND site = ?), 0)), ?, ? FROM links WHERE keyword = ? AND site = ?',
+                          (keyword, site, keyword, site, url, self.PENDING, keyword, site))
+
+    def add_links(self, keyword, site, urls):
+        # add_link for a whole collected list in one transaction; links already in the journal keep their index.
+        with self.lock:
+            for url in urls:
+                self.insert_link(keyword, site, url)
+            self.conn.commit()
+
+    def add_link(self, keyword, site, url):
+        # Returns (idx, state, retries); a link keeps its index across restarts so file names stay stable.
+        with self.lock:
+            self.insert_link(keyword, site, url)
+            self.conn.commit()
+            return self.conn.execute('SELECT idx, state, retries FROM links WHERE keyword = ? AND site = ? AND url = ?',
+                                     (keyword, site, url)).fetchone()
+
+    def link(self, keyword, site, idx):
+        # Returns (path, etag, last_modified) of a stored link.
+        with self.lock:
+            return self.conn.execute('SELECT path, etag, last_modified FROM links '
+                                     'WHERE keyword = ? AND site = ? AND idx = ?', (keyword, site, idx)).fetchone()
+
+    def needs_download(self, state, retries):
+        return state == self.PENDING or (state == self.FAILED and retries < self.max_retries)
+
+    def links(self, keyword, site):
+        with self.lock:
+            rows = self.conn.execute('SELECT url FROM links WHERE keyword = ? AND site = ? ORDER BY idx',
+                                     (keyword, site)).fetchall()
+        return [row[0] for row in rows]
+
+    def mark(self, keyword, site, idx, state, path=None, validators=None, reason=None):
+        # A rejected link keeps its reason and, like an invalid one, is not downloaded again.
+        validators = validators or {}
+        with self.lock:
+            if state == self.FAILED:
+                self.conn.execute('UPDATE links SET state = ?, retries = retries + 1 '
+                                  'WHERE keyword = ? AND site = ? AND idx = ?', (state, keyword, site, idx))
+            else:
+                self.conn.execute('UPDATE links SET state = ?, path = ?, etag = ?, last_modified = ?, reason = ? '
+                                  'WHERE keyword = ? AND site = ? AND idx = ?',
+                                  (state, path, validators.get('etag'), validators.get('last_modified'), reason,
+                                   keyword, site, idx))
+            self.conn.commit()
+
+    def link_count(self, keyword, site):
+        with self.lock:
+            row = self.conn.execute('SELECT COUNT(*) FROM links WHERE keyword = ? AND site = ?',
+                                    (keyword, site)).fetchone()
+        return row[0]
+
+    def count(self, keyword, site, state=OK):
+        with self.lock:
+            row = self.conn.execute('SELECT COUNT(*) FROM links WHERE keyword = ? AND site = ? AND state = ?',
+                                    (keyword, site, state)).fetchone()
+        return row[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_process_journals = {}
+
+
+def get_journal(path, max_retries=3):
+    # Keyed by pid as well: a SQLite connection must not be shared with forked workers.
+    key = (path, os.getpid())
+    if key not in _process_journals:
+        _process_journals[key] = CrawlJournal(path, max_retries=max_retries)
+    return _process_journals[key]
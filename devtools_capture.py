@@ -0,0 +1,94 @@
+import json
+import base64
+import threading
+
+
+class ResponseCapture:
+    # Keeps the bodies of the images Chrome has already loaded, read through the DevTools performance log and
+    # Network.getResponseBody, so the download stage can use them instead of fetching every image a second time.
+    LOG_PREFS = {'performance': 'ALL'}
+
+    def __init__(self, browser, max_bytes=256 * 1024 * 1024):
+        self.browser = browser
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.bodies = {}
+        self.size = 0
+        self.requests = {}
+        self.stats = {'captured': 0, 'hits': 0, 'misses': 0, 'dropped': 0}
+
+        # A pooled browser still has the events of its previous lease in the log.
+        self.read_log()
+
+    @staticmethod
+    def enable(chrome_options, capabilities):
+        chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+        capabilities['goog:loggingPrefs'] = ResponseCapture.LOG_PREFS
+        # Older chromedrivers only know the unprefixed capability.
+        capabilities['loggingPrefs'] = ResponseCapture.LOG_PREFS
+
+    def read_log(self):
+        try:
+            entries = self.browser.get_log('performance')
+        except Exception:
+            return []
+
+        events = []
+        for entry in entries:
+            try:
+                events.append(json.loads(entry['message'])['message'])
+            except (KeyError, ValueError):
+                continue
+        return events
+
+    def poll(self):
+        # Must run on the thread that drives the browser; the download threads only ever call pop().
+        for event in self.read_log():
+            method = event.get('method')
+            params = event.get('params', {})
+
+            if method == 'Network.responseReceived':
+                response = params.get('response', {})
+                url = response.get('url', '')
+                if params.get('type') == 'Image' and response.get('status') == 200 and not url.startswith('data:'):
+                    self.requests[params['requestId']] = url
+
+            elif method == 'Network.loadingFinished':
+                url = self.requests.pop(params.get('requestId'), None)
+                if url is not None:
+                    self.store(params['requestId'], url)
+
+            elif method == 'Network.loadingFailed':
+                self.requests.pop(params.get('requestId'), None)
+
+    def store(self, request_id, url):
+        with self.lock:
+            if url in self.bodies:
+                return
+            if self.size >= self.max_bytes:
+                self.stats['dropped'] += 1
+                return
+
+        try:
+            result = self.browser.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception:
+            # Chrome evicts bodies from its buffer under memory pressure; the image is simply downloaded then.
+            return
+
+        body = result.get('body', '')
+        data = base64.b64decode(body) if result.get('base64Encoded') else body.encode('latin-1')
+
+        with self.lock:
+            self.bodies[url] = data
+            self.size += len(data)
+            self.stats['captured'] += 1
+
+    def pop(self, url):
+        with self.lock:
+            data = self.bodies.pop(url, None)
+            if data is None:
+                self.stats['misses'] += 1
+                return None
+            self.size -= len(data)
+            self.stats['hits'] += 1
+            return data
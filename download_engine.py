@@ -0,0 +1,246 @@
+import time
+import queue
+import hashlib
+import threading
+import multiprocessing.util
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from image_format import HEADER_SIZE, PROBE_SIZE, sniff
+from rate_limiter import RateLimiter
+from proxy_pool import proxy_url
+
+
+_FED = object()
+
+
+class InvalidImage(Exception):
+    pass
+
+
+class NotModified(Exception):
+    pass
+
+
+class DownloadEngine:
+    THROTTLE_STATUS = (429, 503)
+
+    def __init__(self, max_workers=16, max_per_host=6, connect_timeout=5, read_timeout=20, rate_limiter=None,
+                 proxy_pool=None):
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.proxy_pool = proxy_pool
+        self.max_per_host = max_per_host
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=max_per_host, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.host_slots = {}
+        self.lock = threading.Lock()
+
+    def host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.host_slots[host]
+
+    def fetch(self, url, sink, max_bytes=0, proxy=None, validators=None, image_filter=None):
+        # Streams an image into sink. The format is sniffed from the first bytes and the transfer is aborted as soon
+        # as the response turns out not to be an image, grows past max_bytes or fails image_filter (checked on the
+        # header bytes, see ImageFilter). Returns (format, size, sha256).
+        # validators ({'etag', 'last_modified'}) makes the request conditional, NotModified is raised on a 304, and
+        # is updated with the validators of the response.
+        digest = hashlib.sha256()
+        fmt = None
+        head = b''
+        total = 0
+        probing = False
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(RateLimiter.IMAGE, url)
+
+        with self.host_slot(url):
+            with self.open(url, proxy=proxy, headers=self.conditional_headers(validators)) as response:
+                if response.status_code == 304:
+                    raise NotModified(url)
+                if validators is not None:
+                    validators['etag'] = response.headers.get('ETag')
+                    validators['last_modified'] = response.headers.get('Last-Modified')
+
+                length = response.headers.get('Content-Length', '')
+                if max_bytes and length.isdigit() and int(length) > max_bytes:
+                    raise InvalidImage('최대 크기 초과 : {} bytes'.format(length))
+
+                for chunk in response.iter_content(64 * 1024):
+                    total += len(chunk)
+                    if max_bytes and total > max_bytes:
+                        raise InvalidImage('최대 크기 초과 : {} bytes'.format(total))
+
+                    if fmt is None:
+                        head += chunk
+                        if len(head) < HEADER_SIZE:
+                            continue
+                        fmt = self.check_format(head, response)
+                        chunk = head
+                        if image_filter is not None:
+                            image_filter.check_format(fmt)
+                            probing = image_filter.needs_dimensions
+                    elif probing:
+                        head += chunk
+
+                    if probing:
+                        # Given up without a verdict when the dimensions are not within PROBE_SIZE.
+                        probing = not image_filter.check_dimensions(head, fmt) and len(head) < PROBE_SIZE
+
+                    digest.update(chunk)
+                    sink.write(chunk)
+
+                if fmt is None:
+                    fmt = self.check_format(head, response)
+                    if image_filter is not None:
+                        image_filter.check(head, fmt)
+                    digest.update(head)
+                    sink.write(head)
+
+        return fmt, total, digest.hexdigest()
+
+    @staticmethod
+    def conditional_headers(validators):
+        headers = {}
+        if validators and validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators and validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def open(self, url, proxy=None, headers=None):
+        proxies = {'http': proxy_url(proxy), 'https': proxy_url(proxy)} if proxy else None
+        start = time.time()
+        try:
+            response = self.session.get(url, stream=True, timeout=self.timeout, proxies=proxies, headers=headers)
+        except requests.ConnectionError:
+            if self.rate_limiter is not None:
+                self.rate_limiter.report(RateLimiter.IMAGE, url, throttled=True, reason='connection')
+            if proxy and self.proxy_pool is not None:
+                self.proxy_pool.report(proxy, ok=False)
+            raise
+
+        throttled = response.status_code in self.THROTTLE_STATUS
+        if proxy and self.proxy_pool is not None:
+            # Any response means the proxy works; throttling is held against it since blocks are per address.
+            self.proxy_pool.report(proxy, ok=not throttled, latency=time.time() - start)
+
+        if self.rate_limiter is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            self.rate_limiter.report(RateLimiter.IMAGE, url, throttled=throttled, reason=response.status_code,
+                                     retry_after=float(retry_after) if retry_after.isdigit() else None)
+
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    @staticmethod
+    def check_format(head, response=None):
+        fmt = sniff(head)
+        if fmt is None:
+            content_type = response.headers.get('Content-Type', '') if response is not None else ''
+            raise InvalidImage('이미지가 아닌 응답 {}'.format(content_type).strip())
+        return fmt
+
+    def run(self, fn, items, discard=None):
+        # Yields (item, result, error) in completion order. Items are pulled by a feeder thread so a slow producer
+        # (e.g. a browser that is still scrolling) never delays handling of finished downloads, and only a bounded
+        # window is in flight so closing the generator early (once --limit is met) leaves the rest untouched.
+        # Calls that were already running then are waited for, and discard is called with the result of every call
+        # that finished unread, e.g. to delete the temp file it wrote.
+        results = queue.Queue()
+        slots = threading.Semaphore(self.max_workers * 2)
+        stop = threading.Event()
+        pending = set()
+        state = {'submitted': 0, 'error': None}
+
+        def on_done(future, item):
+            slots.release()
+            results.put((item, future))
+
+        def feed():
+            try:
+                for item in items:
+                    while not slots.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    with self.lock:
+                        if stop.is_set():
+                            return
+                        future = self.executor.submit(fn, item)
+                        pending.add(future)
+                    state['submitted'] += 1
+                    future.add_done_callback(lambda f, item=item: on_done(f, item))
+            except Exception as e:
+                state['error'] = e
+            finally:
+                results.put(_FED)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+
+        received = 0
+        fed = False
+
+        try:
+            while not fed or received < state['submitted']:
+                entry = results.get()
+                if entry is _FED:
+                    fed = True
+                    continue
+
+                item, future = entry
+                received += 1
+                with self.lock:
+                    pending.discard(future)
+                if future.cancelled():
+                    continue
+
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+
+            if state['error'] is not None:
+                raise state['error']
+        finally:
+            with self.lock:
+                stop.set()
+                unread = [future for future in pending if not future.cancel()]
+
+            if discard is not None and unread:
+                futures.wait(unread)
+                for future in unread:
+                    if future.exception() is None:
+                        discard(future.result())
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+_process_engine = None
+
+
+def get_engine(max_workers=16, max_per_host=6, connect_timeout=5, read_timeout=20, rate_limiter=None,
+               proxy_pool=None):
+    global _process_engine
+    if _process_engine is None:
+        _process_engine = DownloadEngine(max_workers=max_workers, max_per_host=max_per_host,
+                                         connect_timeout=connect_timeout, read_timeout=read_timeout,
+                                         rate_limiter=rate_limiter, proxy_pool=proxy_pool)
+        multiprocessing.util.Finalize(None, _process_engine.close, exitpriority=10)
+    return _process_engine
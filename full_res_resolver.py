@@ -0,0 +1,65 @@
+import re
+import json
+from urllib.parse import urlsplit, parse_qs
+
+
+# Google ships the result set as nested arrays inside AF_initDataCallback(...) scripts; every result carries a
+# ["<thumbnail url>", height, width] entry followed by a ["<original url>", height, width] entry.
+GOOGLE_IMAGE_ENTRY = re.compile(r'\["(https?://(?:[^"\\]|\\.)+?)",(\d+),(\d+)\]')
+GOOGLE_THUMBNAIL_HOSTS = ('encrypted-tbn', 'gstatic.com')
+
+NAVER_ORIGINAL_URL = re.compile(r'"originalUrl"\s*:\s*"((?:[^"\\]|\\.)+)"')
+NAVER_THUMBNAIL_HOSTS = ('search.pstatic.net', 'phinf.pstatic.net')
+
+
+def decode_js_string(value):
+    try:
+        return json.loads('"{}"'.format(value))
+    except ValueError:
+        return value
+
+
+def is_google_thumbnail(url):
+    host = urlsplit(url).netloc
+    return any(part in host for part in GOOGLE_THUMBNAIL_HOSTS)
+
+
+def google_original_urls(html):
+    urls = []
+    seen = set()
+
+    for raw, height, width in GOOGLE_IMAGE_ENTRY.findall(html):
+        url = decode_js_string(raw)
+        if is_google_thumbnail(url) or url in seen:
+            continue
+        seen.add(url)
+        urls.append(url)
+
+    return urls
+
+
+def naver_original_from_thumbnail(url):
+    if not url or urlsplit(url).netloc not in NAVER_THUMBNAIL_HOSTS:
+        return None
+
+    src = parse_qs(urlsplit(url).query).get('src')
+    if not src:
+        return None
+
+    original = src[0]
+    return original if original.startswith('http') else None
+
+
+def naver_original_urls(html, thumbnails=()):
+    urls = []
+    seen = set()
+
+    candidates = [decode_js_string(raw) for raw in NAVER_ORIGINAL_URL.findall(html)]
+    candidates += [naver_original_from_thumbnail(thumbnail) for thumbnail in thumbnails]
+
+    for url in candidates:
+        if url and url not in seen:
+            seen.add(url)
+            urls.append(url)
+
+    return urls
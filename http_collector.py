@@ -0,0 +1,170 @@
+import re
+import html
+import time
+import requests
+from full_res_resolver import decode_js_string, google_original_urls, naver_original_urls
+from collect_links import CaptchaDetected, CollectLinks
+from download_engine import DownloadEngine
+from rate_limiter import RateLimiter
+from metrics import get_metrics
+from proxy_pool import proxy_url
+
+
+IMG_TAG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+IMG_ATTRIBUTE = re.compile(r'\b(data-iurl|data-src|src)\s*=\s*"([^"]*)"', re.IGNORECASE)
+NAVER_THUMB = re.compile(r'"thumb"\s*:\s*"((?:[^"\\]|\\.)+)"')
+
+
+def img_sources(page):
+    # The same choice the browser extraction makes: the real URL of a lazy loaded thumbnail is in data-iurl or
+    # data-src while src only holds a placeholder, otherwise src itself (which may be a data URI).
+    srcs = []
+    for tag in IMG_TAG.findall(page):
+        attributes = {name.lower(): html.unescape(value) for name, value in IMG_ATTRIBUTE.findall(tag)}
+        src = attributes.get('data-iurl') or attributes.get('data-src') or attributes.get('src', '')
+        if src.startswith(('http://', 'https://', 'data:image/')):
+            srcs.append(src)
+    return srcs
+
+
+class HttpCollectLinks:
+    # Collects links from the result pages over plain HTTP, without a browser. Same interface as CollectLinks, so
+    # download_from_site can use either one. Pages are requested one after another through the sites' paging
+    # parameters instead of scrolling; collection ends at limit, at MAX_PAGES or at a page without new links.
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) ' \
+                 'Chrome/120.0.0.0 Safari/537.36'
+    CAPTCHA_MARKERS = ('id="captcha-form"', 'g-recaptcha', 'id="recaptcha"')
+
+    GOOGLE_PAGE_SIZE = 100
+    NAVER_PAGE_SIZE = 50
+    MAX_PAGES = 20
+
+    def __init__(self, proxy=None, session=None, rate_limiter=None, search_urls=None, timeout=(5, 20),
+                 proxy_pool=None):
+        self.rate_limiter = rate_limiter
+        self.proxy = proxy
+        self.proxy_pool = proxy_pool
+        self.search_urls = dict(CollectLinks.SEARCH_URLS, **(search_urls or {}))
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.owns_session = session is None
+        self.proxies = {'http': proxy_url(proxy), 'https': proxy_url(proxy)} if proxy else None
+        # Nothing is loaded by a browser, so there is nothing to capture.
+        self.capture = None
+        # Set when the last collection stopped at limit or MAX_PAGES rather than at the end of the results.
+        self.truncated = False
+
+    def finish(self):
+        if self.owns_session:
+            self.session.close()
+
+    def open(self, url):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(RateLimiter.PAGE, url)
+
+        start = time.time()
+        with get_metrics().timer('page_load'):
+            try:
+                response = self.session.get(url, headers={'User-Agent': self.USER_AGENT}, proxies=self.proxies,
+                                            timeout=self.timeout)
+            except requests.ConnectionError:
+                if self.proxy_pool is not None and self.proxy:
+                    self.proxy_pool.report(self.proxy, ok=False)
+                raise
+
+        throttled = response.status_code in DownloadEngine.THROTTLE_STATUS
+        blocked = throttled or '/sorry/' in response.url or any(marker in response.text
+                                                                   for marker in self.CAPTCHA_MARKERS)
+        if self.proxy_pool is not None and self.proxy:
+            self.proxy_pool.report(self.proxy, ok=not blocked, latency=time.time() - start)
+        if self.rate_limiter is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            self.rate_limiter.report(RateLimiter.PAGE, url, throttled=blocked,
+                                     reason=response.status_code if throttled else 'captcha',
+                                     retry_after=float(retry_after) if retry_after.isdigit() else None)
+        if blocked:
+            raise CaptchaDetected('캡차 페이지 감지 : {}'.format(response.url))
+
+        response.raise_for_status()
+        return response.text
+
+    def google(self, keyword, add_url="", limit=0):
+        return list(self.iter_google(keyword, add_url, limit=limit))
+
+    def naver(self, keyword, add_url="", limit=0):
+        return list(self.iter_naver(keyword, add_url, limit=limit))
+
+    def google_full(self, keyword, add_url="", limit=0):
+        return list(self.iter_google_full(keyword, add_url, limit=limit))
+
+    def naver_full(self, keyword, add_url="", limit=0):
+        return list(self.iter_naver_full(keyword, add_url, limit=limit))
+
+    def google_page_url(self, keyword, add_url, page):
+        return "{}?q={}&source=lnms&tbm=isch{}&ijn={}&start={}".format(
+            self.search_urls['google'], keyword, add_url, page, page * self.GOOGLE_PAGE_SIZE)
+
+    def naver_page_url(self, keyword, add_url, page):
+        return "{}?where=image&sm=tab_jum&query={}{}&start={}&display={}".format(
+            self.search_urls['naver'], keyword, add_url, page * self.NAVER_PAGE_SIZE + 1, self.NAVER_PAGE_SIZE)
+
+    @staticmethod
+    def google_thumbnails(page):
+        return img_sources(page)
+
+    @staticmethod
+    def naver_thumbnails(page):
+        # The grid markup first, then the result data embedded for the lazy loaded part of the page.
+        srcs = img_sources(page) + [decode_js_string(raw) for raw in NAVER_THUMB.findall(page)]
+        return [src for src in srcs if not src.startswith('data:')]
+
+    @staticmethod
+    def google_originals(page):
+        return google_original_urls(page)
+
+    @staticmethod
+    def naver_originals(page):
+        return naver_original_urls(page, HttpCollectLinks.naver_thumbnails(page))
+
+    def iter_pages(self, site, keyword, page_url, extract, limit=0):
+        seen = set()
+
+        try:
+            print('정보 수집 중 . . .')
+
+            for page in range(self.MAX_PAGES):
+                text = self.open(page_url(page))
+
+                with get_metrics().timer('extract'):
+                    links = CollectLinks.new_links(extract(text), seen)
+                if not links:
+                    self.truncated = False
+                    break
+                yield from links
+
+                if limit and len(seen) >= limit:
+                    self.truncated = True
+                    break
+            else:
+                self.truncated = True
+
+            print('링크 수집 완료 : 사이트 : {}, 키워드 : {}, 모두 : {}'.format(site, keyword, len(seen)))
+        finally:
+            self.finish()
+
+    def iter_google(self, keyword, add_url="", limit=0):
+        return self.iter_pages('google', keyword, lambda page: self.google_page_url(keyword, add_url, page),
+                               self.google_thumbnails, limit=limit)
+
+    def iter_naver(self, keyword, add_url="", limit=0):
+        return self.iter_pages('naver', keyword, lambda page: self.naver_page_url(keyword, add_url, page),
+                               self.naver_thumbnails, limit=limit)
+
+    def iter_google_full(self, keyword, add_url="", limit=0):
+        # Original URLs come from the result data embedded in the pages (see full_res_resolver), no viewer clicks.
+        return self.iter_pages('google_full', keyword, lambda page: self.google_page_url(keyword, add_url, page),
+                               self.google_originals, limit=limit)
+
+    def iter_naver_full(self, keyword, add_url="", limit=0):
+        return self.iter_pages('naver_full', keyword, lambda page: self.naver_page_url(keyword, add_url, page),
+                               self.naver_originals, limit=limit)
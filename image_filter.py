@@ -0,0 +1,59 @@
+from download_engine import InvalidImage
+from image_format import dimensions
+
+
+class RejectedImage(InvalidImage):
+    pass
+
+
+class ImageFilter:
+    # Quality rules checked while an image is still arriving: the format as soon as it is sniffed and the dimensions
+    # as soon as the header holding them is in, so a transfer that fails a rule is aborted after a few KB. Zero means
+    # no limit; max_aspect is the longer side over the shorter one.
+    def __init__(self, min_width=0, min_height=0, max_width=0, max_height=0, max_aspect=0, formats=None):
+        self.min_width = min_width
+        self.min_height = min_height
+        self.max_width = max_width
+        self.max_height = max_height
+        self.max_aspect = max_aspect
+        self.formats = set(formats) if formats else None
+
+    @classmethod
+    def parse_formats(cls, text):
+        # "jpg,png" from the command line; jpeg is accepted for jpg.
+        formats = [name.strip().lower() for name in text.split(',') if name.strip()]
+        return ['jpg' if name == 'jpeg' else name for name in formats]
+
+    def is_active(self):
+        return bool(self.needs_dimensions or self.formats)
+
+    @property
+    def needs_dimensions(self):
+        return bool(self.min_width or self.min_height or self.max_width or self.max_height or self.max_aspect)
+
+    def check_format(self, fmt):
+        if self.formats is not None and fmt not in self.formats:
+            raise RejectedImage('허용되지 않는 형식 : {}'.format(fmt))
+
+    def check_size(self, width, height):
+        if width < self.min_width or height < self.min_height:
+            raise RejectedImage('너무 작은 이미지 : {}x{}'.format(width, height))
+        if (self.max_width and width > self.max_width) or (self.max_height and height > self.max_height):
+            raise RejectedImage('너무 큰 이미지 : {}x{}'.format(width, height))
+        if self.max_aspect and min(width, height) > 0 and \
+                max(width, height) / min(width, height) > self.max_aspect:
+            raise RejectedImage('가로세로 비율 초과 : {}x{}'.format(width, height))
+
+    def check_dimensions(self, head, fmt):
+        # Returns True once the dimensions were found in head (and passed), False while more bytes are needed.
+        size = dimensions(head, fmt)
+        if size is None:
+            return False
+        self.check_size(*size)
+        return True
+
+    def check(self, data, fmt):
+        # For a payload that is already complete, e.g. one taken from the browser capture.
+        self.check_format(fmt)
+        if self.needs_dimensions:
+            self.check_dimensions(data, fmt)
@@ -0,0 +1,119 @@
+import struct
+
+
+HEADER_SIZE = 32
+# Header bytes kept to find the dimensions in; EXIF and ICC data can push a JPEG frame header this far back.
+PROBE_SIZE = 256 * 1024
+
+
+def sniff(head):
+    head = bytes(head[:HEADER_SIZE])
+
+    if head.startswith(b'\xff\xd8'):
+        return 'jpg'
+    elif head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    elif head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    elif head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    elif head[:2] == b'BM':
+        return 'bmp'
+    elif head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    elif head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return 'avif'
+    else:
+        return None
+
+
+def dimensions(head, fmt):
+    # (width, height) read from the first bytes of an image, or None while head does not reach that far yet.
+    head = bytes(head)
+    try:
+        if fmt == 'png':
+            return struct.unpack('>II', head[16:24]) if len(head) >= 24 else None
+        elif fmt == 'gif':
+            return struct.unpack('<HH', head[6:10]) if len(head) >= 10 else None
+        elif fmt == 'bmp':
+            return bmp_dimensions(head)
+        elif fmt == 'webp':
+            return webp_dimensions(head)
+        elif fmt == 'jpg':
+            return jpeg_dimensions(head)
+        elif fmt == 'tiff':
+            return tiff_dimensions(head)
+        elif fmt == 'avif':
+            # Image spatial extents property: version and flags, then width and height.
+            i = head.find(b'ispe')
+            return struct.unpack('>II', head[i + 8:i + 16]) if i >= 0 and len(head) >= i + 16 else None
+    except struct.error:
+        return None
+    return None
+
+
+def bmp_dimensions(head):
+    if len(head) < 26:
+        return None
+    if struct.unpack('<I', head[14:18])[0] == 12:
+        return struct.unpack('<HH', head[18:22])
+    width, height = struct.unpack('<ii', head[18:26])
+    # Negative height means a top-down bitmap.
+    return abs(width), abs(height)
+
+
+def webp_dimensions(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3fff, height & 0x3fff
+    elif chunk == b'VP8L' and len(head) >= 25:
+        bits = struct.unpack('<I', head[21:25])[0]
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    elif chunk == b'VP8X' and len(head) >= 30:
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    return None
+
+
+def jpeg_dimensions(head):
+    # Walks the marker segments up to the first start of frame (SOF0-SOF15 without DHT, JPG and DAC).
+    i = 2
+    while i + 4 <= len(head):
+        if head[i] != 0xff:
+            return None
+        marker = head[i + 1]
+        if marker == 0xff:
+            i += 1
+            continue
+        if marker == 0x01 or 0xd0 <= marker <= 0xd8:
+            i += 2
+            continue
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            if i + 9 > len(head):
+                return None
+            height, width = struct.unpack('>HH', head[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack('>H', head[i + 2:i + 4])[0]
+    return None
+
+
+def tiff_dimensions(head):
+    order = '<' if head[:2] == b'II' else '>'
+    offset = struct.unpack(order + 'I', head[4:8])[0]
+    if offset + 2 > len(head):
+        return None
+    count = struct.unpack(order + 'H', head[offset:offset + 2])[0]
+    if offset + 2 + count * 12 > len(head):
+        return None
+
+    size = {}
+    for i in range(count):
+        entry = head[offset + 2 + i * 12:offset + 14 + i * 12]
+        tag, kind = struct.unpack(order + 'HH', entry[:4])
+        if tag in (256, 257):
+            # ImageWidth and ImageLength are SHORT or LONG.
+            size[tag] = struct.unpack(order + 'H', entry[8:10])[0] if kind == 3 else \
+                struct.unpack(order + 'I', entry[8:12])[0]
+    if 256 in size and 257 in size:
+        return size[256], size[257]
+    return None
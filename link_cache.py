@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import hashlib
+
+
+class LinkCache:
+    # An entry expires ttl seconds after it was written (its mtime); hits only move its atime, which orders the least
+    # recently used entries for eviction.
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def covers(link_limit, limit):
+        # Whether links collected up to link_limit (0: all the results there are) serve a collection up to limit.
+        return link_limit is not None and (link_limit == 0 or 0 < limit <= link_limit)
+
+    @staticmethod
+    def make_key(keyword, site, face, full_resolution):
+        return json.dumps([keyword, site, bool(face), bool(full_resolution)], ensure_ascii=False)
+
+    def file_for(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key, limit=0):
+        # Returns (links, link_limit), or None unless an entry that covers limit is there.
+        path = self.file_for(key)
+
+        try:
+            created = os.stat(path).st_mtime
+            if time.time() - created > self.ttl:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('key') != key or not self.covers(entry.get('limit'), limit):
+                return None
+            os.utime(path, (time.time(), created))
+        except (OSError, ValueError):
+            return None
+
+        return entry['links'], entry['limit']
+
+    def put(self, key, links, limit=0):
+        path = self.file_for(key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'created': time.time(), 'limit': limit, 'links': links}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        total = 0
+
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self.remove(path)
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for atime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
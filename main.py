@@ -1,13 +1,32 @@
 import os
-import requests
 import shutil
-from multiprocessing import Pool
 import argparse
-from collect_links import CollectLinks
-import imghdr
+import contextlib
+from collect_links import resolve_driver_path
+from browser_pool import get_pool
+from tab_pool import get_tab_pool
+from http_collector import HttpCollectLinks
+from download_engine import InvalidImage, NotModified, get_engine
+from image_filter import ImageFilter, RejectedImage
+from pipeline import ImageRecord, LinkStream
+from content_index import get_index
+from crawl_journal import CrawlJournal, get_journal
+from link_cache import LinkCache
+from scheduler import Scheduler
+from rate_limiter import RateLimiter
+from proxy_pool import ProxyPool
+from metrics import get_metrics
+from manifest import Manifest, get_manifest
+from work_queue import WorkQueue
+from shard_store import get_writer, recover_shards, location_exists
+import io
 import base64
-from pathlib import Path
-import random
+import time
+import queue
+import threading
+import socket
+import hashlib
+import tempfile
 
 
 class Sites:
@@ -35,9 +54,20 @@ class Sites:
             return "&face=1"
 
 
+_STREAM_DONE = object()
+
+
 class AutoCrawler:
+    CANDIDATE_HEADROOM = 1.5
+
     def __init__(self, skip_already_exist=True, n_threads=4, do_google=True, do_naver=True, download_path='download',
-                 full_resolution=False, face=False, no_gui=False, limit=0, proxy_list=None):
+                 full_resolution=False, face=False, no_gui=False, limit=0, proxy_list=None, browser_max_uses=20,
+                 download_workers=16, per_host_connections=6, dedup='link', link_cache_ttl=7 * 24 * 3600,
+                 link_cache_size=512, refresh_links=False, max_bytes=50 * 1024 * 1024, site_limits=None,
+                 task_timeout=1200, max_retries=2, page_rate=0.5, image_rate=10, profile=False, search_urls=None,
+                 rebalance='report', rebalance_target=0, capture_images=False, output='files',
+                 shard_size=1024 * 1024 * 1024, queue_path=None, node_id=None, lease_time=300, browserless=False,
+                 browser_profile='default', delta=False, image_filter=None, tabs=1):
 
         self.skip = skip_already_exist
         self.n_threads = n_threads
@@ -48,51 +78,46 @@ class AutoCrawler:
         self.face = face
         self.no_gui = no_gui
         self.limit = limit
-        self.proxy_list = proxy_list if proxy_list and len(proxy_list) > 0 else None
+        self.proxy_list = [proxy.strip() for proxy in proxy_list or [] if proxy.strip()] or None
+        self.proxy_pool = None
+        self.browser_max_uses = browser_max_uses
+        self.driver_path = None
+        self.download_workers = download_workers
+        self.per_host_connections = per_host_connections
+        self.dedup = dedup
+        self.link_cache_ttl = link_cache_ttl
+        self.link_cache_size = link_cache_size
+        self.refresh_links = refresh_links
+        self.max_bytes = max_bytes
+        self.image_filter = image_filter if image_filter is not None and image_filter.is_active() else None
+        self.site_limits = site_limits or {}
+        self.task_timeout = task_timeout
+        self.max_retries = max_retries
+        self.summary = None
+        self.page_rate = page_rate
+        self.image_rate = image_rate
+        self.rate_limiter = None
+        self.profile = profile
+        self.search_urls = search_urls
+        self.rebalance = rebalance
+        self.rebalance_target = rebalance_target
+        self.capture_images = capture_images
+        self.output = output
+        self.shard_size = shard_size
+        self.queue_path = queue_path
+        self.node_id = node_id or socket.gethostname()
+        self.lease_time = lease_time
+        self.browserless = browserless
+        self.browser_profile = browser_profile
+        self.delta = delta
+        # Collections a worker runs at once, each in a window of the same browser.
+        self.tabs = max(1, tabs)
+        if self.tabs > 1 and self.capture_images:
+            print('--capture-images 는 --tabs 와 함께 사용할 수 없어 사용하지 않습니다.')
+            self.capture_images = False
 
         os.makedirs('./{}'.format(self.download_path), exist_ok=True)
 
-    @staticmethod
-    def all_dirs(path):
-        paths = []
-        for dir in os.listdir(path):
-            if os.path.isdir(path + '/' + dir):
-                paths.append(path + '/' + dir)
-
-        return paths
-
-    @staticmethod
-    def all_files(path):
-        paths = []
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if os.path.isfile(path + '/' + file):
-                    paths.append(path + '/' + file)
-
-        return paths
-
-    @staticmethod
-    def get_extension_from_link(link, default='jpg'):
-        splits = str(link).split('.')
-        if len(splits) == 0:
-            return default
-        ext = splits[-1].lower()
-        if ext == 'jpg' or ext == 'jpeg':
-            return 'jpg'
-        elif ext == 'gif':
-            return 'gif'
-        elif ext == 'png':
-            return 'png'
-        else:
-            return default
-
-    @staticmethod
-    def validate_image(path):
-        ext = imghdr.what(path)
-        if ext == 'jpeg':
-            ext = 'jpg'
-        return ext
-
     @staticmethod
     def make_dir(dirname):
         current_path = os.getcwd()
@@ -115,128 +140,593 @@ class AutoCrawler:
 
         return keywords
 
-    @staticmethod
-    def save_object_to_file(object, file_path, is_base64=False):
-        try:
-            with open('{}'.format(file_path), 'wb') as file:
-                if is_base64:
-                    file.write(object)
-                else:
-                    shutil.copyfileobj(object.raw, file)
-        except Exception as e:
-            print('저장 실패 - {}'.format(e))
-
     @staticmethod
     def base64_to_object(src):
         header, encoded = str(src).split(',', 1)
         data = base64.decodebytes(bytes(encoded, encoding='utf-8'))
         return data
 
-    def download_images(self, keyword, links, site_name, max_count=0):
-        self.make_dir('{}/{}'.format(self.download_path, keyword.replace('"', '')))
-        total = len(links)
-        success_count = 0
+    def get_engine(self):
+        return get_engine(max_workers=self.download_workers, max_per_host=self.per_host_connections,
+                          rate_limiter=self.rate_limiter, proxy_pool=self.proxy_pool)
+
+    def get_journal(self):
+        return get_journal(os.path.join(self.download_path, '.crawl_journal.sqlite'))
+
+    def candidate_limit(self, journal, keyword, site_name):
+        # Some candidates always fail or turn out to be duplicates, so links are collected a little past --limit. A
+        # task that came up short collects past the links it already has by the images still missing.
+        if not self.limit:
+            return 0
+        if self.delta:
+            return int(self.limit * self.CANDIDATE_HEADROOM)
+        missing = max(self.limit - journal.count(keyword, site_name), 0)
+        return journal.link_count(keyword, site_name) + int(missing * self.CANDIDATE_HEADROOM)
+
+    def get_link_cache(self):
+        if self.link_cache_ttl <= 0:
+            return None
+        return LinkCache(os.path.join(self.download_path, '.link_cache'), ttl=self.link_cache_ttl,
+                         max_bytes=self.link_cache_size * 1024 * 1024)
+
+    def get_manifest(self):
+        return get_manifest(os.path.join(self.download_path, '.manifest.sqlite'))
+
+    def shard_path(self):
+        return os.path.join(self.download_path, 'shards')
+
+    def get_shard_writer(self):
+        if self.output != 'shards':
+            return None
+        return get_writer(self.shard_path(), max_bytes=self.shard_size)
+
+    def get_content_index(self):
+        if self.dedup == 'off':
+            return None
+        exists = None
+        if self.output == 'shards':
+            exists = lambda path: location_exists(self.shard_path(), path)
+        return get_index(os.path.join(self.download_path, '.content_index.sqlite'), exists=exists)
 
-        if max_count == 0:
-            max_count = total
+    @staticmethod
+    def remove_stale_parts(dir_name, max_age=3600):
+        now = time.time()
+        for entry in os.scandir(dir_name):
+            if entry.name.endswith('.part') and now - entry.stat().st_mtime > max_age:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def fetch_link(self, dir_name, link, site_name, capture=None, proxy_key=None, validators=None):
+        # Returns (temp path, format, sha256, known copy). Payloads go to a hidden temp file in the keyword directory
+        # and are only renamed to their final name once they are known to be a new, valid image. Bodies the browser
+        # already loaded are taken from the capture instead of being downloaded again. A link being revalidated
+        # (validators) is always asked for, the stored copy is what it is checked against.
+        index = self.get_content_index()
+        if index is not None and not validators and not str(link).startswith('data:'):
+            known = index.find_url(link)
+            if known is not None:
+                return None, None, None, known
+
+        fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.part', dir=dir_name)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                ext, size, digest = self.read_payload(link, site_name, f, capture, proxy_key, validators)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
 
-        for index, link in enumerate(links):
-            if success_count >= max_count:
-                break
+        return tmp_path, ext, digest, None
 
+    @staticmethod
+    def discard_payload(result):
+        # The result of a fetch_link nobody is going to save.
+        tmp_path = result[0]
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def read_payload(self, link, site_name, sink, capture=None, proxy_key=None, validators=None):
+        # Writes the image behind link into sink and returns (format, size, sha256): data URIs are decoded, bodies
+        # the browser already loaded come from the capture and anything else is downloaded.
+        metrics = get_metrics()
+        data = None
+        if str(link).startswith('data:'):
+            with metrics.timer('decode'):
+                data = self.base64_to_object(link)
+        elif capture is not None:
+            data = capture.pop(link)
+            if data is not None:
+                metrics.inc('captured', site_name)
+
+        if data is not None:
+            if self.max_bytes and len(data) > self.max_bytes:
+                raise InvalidImage('최대 크기 초과 : {} bytes'.format(len(data)))
+            ext = self.get_engine().check_format(data)
+            if self.image_filter is not None:
+                self.image_filter.check(data, ext)
+            sink.write(data)
+            digest = hashlib.sha256(data).hexdigest()
+            size = len(data)
+        else:
+            # Asked per image: a task moves to another proxy when its own gets quarantined halfway.
+            proxy = self.proxy_pool.assign(proxy_key) if proxy_key is not None else None
+            with metrics.timer('fetch'):
+                ext, size, digest = self.get_engine().fetch(link, sink, max_bytes=self.max_bytes, proxy=proxy,
+                                                            validators=validators, image_filter=self.image_filter)
+
+        metrics.inc('bytes_downloaded', site_name, size)
+        return ext, size, digest
+
+    def store_duplicate(self, digest, existing, no_ext_path, meta):
+        # A payload is stored once per keyword directory; other keywords get a hard link when dedup is 'link', so
+        # every keyword directory stays complete without storing the bytes twice. With shard output the copy is a
+        # reference record to the location that holds the bytes. Returns (path, stored bytes) or (None, 0).
+        index = self.get_content_index()
+        if self.dedup != 'link' or not index.place(digest, os.path.dirname(no_ext_path)):
+            print('중복 이미지 건너뛰기 - {}'.format(existing))
+            return None, 0
+
+        writer = self.get_shard_writer()
+        if writer is None:
+            path = no_ext_path + os.path.splitext(existing)[1]
             try:
-                print('키워드 {}을(를) {}로 다운로드 중 | {} / {} '.format(keyword, site_name, success_count + 1, max_count))
-
-                if str(link).startswith('data:image/jpeg;base64'):
-                    response = self.base64_to_object(link)
-                    ext = 'jpg'
-                    is_base64 = True
-                elif str(link).startswith('data:image/png;base64'):
-                    response = self.base64_to_object(link)
-                    ext = 'png'
-                    is_base64 = True
-                else:
-                    response = requests.get(link, stream=True)
-                    ext = self.get_extension_from_link(link)
-                    is_base64 = False
-
-                no_ext_path = '{}/{}/{}_{}'.format(self.download_path.replace('"', ''), keyword, site_name,
-                                                   str(index).zfill(4))
+                os.link(existing, path)
+            except OSError:
+                shutil.copyfile(existing, path)
+            size = os.path.getsize(path)
+        elif os.path.isfile(existing):
+            # Stored as a plain file by an earlier run with --output files.
+            with open(existing, 'rb') as f:
+                data = f.read()
+            path = writer.append(data, dict(meta, format=os.path.splitext(existing)[1][1:]))
+            size = len(data)
+        else:
+            path = writer.append(b'', dict(meta, ref=existing))
+            size = 0
+
+        print('중복 이미지 링크 : {} -> {}'.format(existing, path))
+        return path, size
+
+    def stored_duplicate(self, digest, existing, no_ext_path, meta):
+        path, size = self.store_duplicate(digest, existing, no_ext_path, meta)
+        if path is None:
+            return CrawlJournal.DUPLICATE, None, digest, 0
+        return CrawlJournal.OK, path, digest, size
+
+    def save_image(self, keyword, site_name, index_no, link, result):
+        # Returns (state, path, sha256, stored bytes); path is a shard record location with --output shards.
+        tmp_path, ext, digest, known = result
+        no_ext_path = '{}/{}/{}_{}'.format(self.download_path.replace('"', ''), keyword, site_name,
+                                           str(index_no).zfill(4))
+        url = None if link.startswith('data:') else link
+        index = self.get_content_index()
+        writer = self.get_shard_writer()
+        metrics = get_metrics()
+
+        phash = None
+        if index is not None and known is None:
+            with metrics.timer('dedup'):
+                phash = index.perceptual_hash(tmp_path)
+                known = index.find(digest, phash)
+            if known is not None and url is not None:
+                index.add_url(link, known[0])
+
+        meta = {'keyword': keyword, 'site': site_name, 'url': url, 'format': ext,
+                'sha256': known[0] if known is not None else digest}
+
+        if known is not None:
+            if tmp_path is not None:
+                os.remove(tmp_path)
+            return self.stored_duplicate(known[0], known[1], no_ext_path, meta)
+
+        with metrics.timer('save'):
+            if writer is None:
                 path = no_ext_path + '.' + ext
-                self.save_object_to_file(response, path, is_base64=is_base64)
+                os.replace(tmp_path, path)
+                size = os.path.getsize(path)
+            else:
+                with open(tmp_path, 'rb') as f:
+                    data = f.read()
+                path = writer.append(data, meta)
+                os.remove(tmp_path)
+                size = len(data)
+
+        if index is not None:
+            with metrics.timer('dedup'):
+                existing = index.add(digest, phash, path, url=url, directory=os.path.dirname(no_ext_path))
+            # A record already appended to a shard cannot be taken back; it is simply kept as a second copy.
+            if existing is not None and writer is None:
+                os.remove(path)
+                return self.stored_duplicate(digest, existing, no_ext_path, meta)
+
+        return CrawlJournal.OK, path, digest, size
+
+    def download_images(self, keyword, links, site_name, max_count=0, capture=None, proxy_key=None):
+        if self.output == 'shards':
+            dir_name = os.path.join(self.shard_path(), '.tmp')
+        else:
+            dir_name = '{}/{}'.format(self.download_path, keyword.replace('"', ''))
+        self.make_dir(dir_name)
+        self.remove_stale_parts(dir_name)
+        journal = self.get_journal()
+        metrics = get_metrics()
+        manifest = self.get_manifest()
+        success_count = journal.count(keyword, site_name, CrawlJournal.OK)
+
+        # A delta recrawl revalidates every stored image whatever max_count is; only new images stop at it.
+        if max_count and success_count >= max_count and not self.delta:
+            return
 
-                success_count += 1
-                del response
+        if self.delta and self.output == 'files':
+            journal.set_index_floor(keyword, site_name, self.next_file_index(keyword, site_name))
+
+        def pending_links():
+            # Yields (index, link, validators, stored path). In a delta recrawl links stored before are requested
+            # again only when they have validators, conditionally, and only new links are downloaded in full, until
+            # max_count images are stored.
+            for link in links:
+                metrics.inc('links_found', site_name)
+                idx, state, retries = journal.add_link(keyword, site_name, link)
+                if journal.needs_download(state, retries):
+                    if not (max_count and success_count >= max_count):
+                        yield idx, link, {}, None
+                elif self.delta and state == CrawlJournal.OK:
+                    path, etag, last_modified = journal.link(keyword, site_name, idx)
+                    if etag or last_modified:
+                        yield idx, link, {'etag': etag, 'last_modified': last_modified}, path
+
+        results = self.get_engine().run(
+            lambda item: self.fetch_link(dir_name, item[1], site_name, capture, proxy_key, item[2]), pending_links(),
+            discard=self.discard_payload)
 
-                ext2 = self.validate_image(path)
-                if ext2 is None:
-                    print('읽을 수 없는 파일 - {}'.format(link))
-                    os.remove(path)
-                    success_count -= 1
+        try:
+            for (index_no, link, validators, old_path), result, error in results:
+                if isinstance(error, NotModified):
+                    metrics.inc('unchanged', site_name)
+                    continue
+
+                if old_path is not None and error is not None:
+                    # The stored copy stays valid when its revalidation fails.
+                    print('갱신 확인 실패 - {} ({})'.format(link, error))
+                    continue
+
+                if isinstance(error, RejectedImage):
+                    print('조건에 맞지 않는 이미지 - {} ({})'.format(link, error))
+                    metrics.inc('rejected', site_name)
+                    journal.mark(keyword, site_name, index_no, CrawlJournal.REJECTED, reason=str(error))
+                    continue
+
+                if isinstance(error, InvalidImage):
+                    print('읽을 수 없는 파일 - {} ({})'.format(link, error))
+                    metrics.inc('invalid', site_name)
+                    journal.mark(keyword, site_name, index_no, CrawlJournal.INVALID)
+                    continue
+
+                if error is not None:
+                    print('다운로드 실패 - ', error)
+                    metrics.inc('failed', site_name)
+                    journal.mark(keyword, site_name, index_no, CrawlJournal.FAILED)
+                    continue
+
+                try:
+                    print('키워드 {}을(를) {}로 다운로드 중 | {} / {} '.format(keyword, site_name, success_count + 1,
+                                                                     max_count or '-'))
+
+                    state, path, digest, size = self.save_image(keyword, site_name, index_no, link, result)
+
+                except Exception as e:
+                    print('다운로드 실패 - ', e)
+                    if result[0] is not None and os.path.exists(result[0]):
+                        os.remove(result[0])
+                    metrics.inc('failed', site_name)
+                    # A stored copy whose new version could not be saved stays as it is.
+                    if old_path is None:
+                        journal.mark(keyword, site_name, index_no, CrawlJournal.FAILED)
+                    continue
+
+                if old_path is not None:
+                    if state != CrawlJournal.OK:
+                        print('변경된 이미지가 다른 이미지와 중복되어 기존 파일 유지 - {}'.format(link))
+                        metrics.inc('duplicates', site_name)
+                        continue
+                    # Changed at the source: the new version takes the place of the stored one once it is stored. A
+                    # new version under the same name has already replaced it.
+                    print('변경된 이미지 교체 - {}'.format(link))
+                    if path != old_path:
+                        manifest.remove(old_path)
+                        if self.output == 'files' and os.path.exists(old_path):
+                            os.remove(old_path)
+
+                journal.mark(keyword, site_name, index_no, state, path, validators)
+                if state == CrawlJournal.OK:
+                    if old_path is None:
+                        success_count += 1
+                    metrics.inc('images', site_name)
+                    manifest.add(keyword, site_name, path, size, digest)
                 else:
-                    if ext != ext2:
-                        path2 = no_ext_path + '.' + ext2
-                        os.rename(path, path2)
-                        print('확장자 변경됨 : {} -> {}'.format(ext, ext2))
-
-            except Exception as e:
-                print('다운로드 실패 - ', e)
-                continue
+                    metrics.inc('duplicates', site_name)
+
+                if max_count and success_count >= max_count and not self.delta:
+                    break
+        finally:
+            results.close()
+
+    def next_file_index(self, keyword, site_name):
+        # One past the highest "<site>_<index>" file name of the keyword, so a recrawl never reuses a file name, even
+        # for files that predate the journal.
+        indexes = [-1]
+        for path, digest in self.get_manifest().files(keyword, site_name):
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name.startswith(site_name + '_') and name[len(site_name) + 1:].isdigit():
+                indexes.append(int(name[len(site_name) + 1:]))
+        return max(indexes) + 1
 
     def download_from_site(self, keyword, site_code):
         site_name = Sites.get_text(site_code)
         add_url = Sites.get_face_url(site_code) if self.face else ""
+        journal = self.get_journal()
+        # Page loads and downloads of a task share one sticky proxy from the pool.
+        proxy_key = (keyword, site_name) if self.proxy_pool is not None else None
 
         try:
-            proxy = None
-            if self.proxy_list:
-                proxy = random.choice(self.proxy_list)
-            collect = CollectLinks(no_gui=self.no_gui, proxy=proxy)
-        except Exception as e:
-            print('크롬 드라이버를 불러오는 중 오류가 발생했습니다 - {}'.format(e))
-            return
-
-        try:
-            print('링크 가져오는 중 : {} {} '.format(keyword, site_name))
-
-            if site_code == Sites.GOOGLE:
-                links = collect.google(keyword, add_url)
-
-            elif site_code == Sites.NAVER:
-                links = collect.naver(keyword, add_url)
-
-            elif site_code == Sites.GOOGLE_FULL:
-                links = collect.google_full(keyword, add_url)
-
-            elif site_code == Sites.NAVER_FULL:
-                links = collect.naver_full(keyword, add_url)
+            candidate_limit = self.candidate_limit(journal, keyword, site_name)
+            cache = self.get_link_cache()
+            cache_key = cache.make_key(keyword, site_name, self.face, self.full_resolution) if cache else None
+            # A delta recrawl always collects the links again, new results are what it is after.
+            fresh = self.refresh_links or self.delta
+            cached = cache.get(cache_key, candidate_limit) if cache and not fresh else None
+
+            # Links that were cut off at a smaller limit than this one are collected again.
+            if not fresh and \
+                    journal.task_state(keyword, site_name) in (CrawlJournal.COLLECTED, CrawlJournal.DONE) and \
+                    LinkCache.covers(journal.link_limit(keyword, site_name), candidate_limit):
+                print('저널에 저장된 링크로 다운로드 재개 : {} {}'.format(keyword, site_name))
+                self.download_images(keyword, journal.links(keyword, site_name), site_name, max_count=self.limit,
+                                     proxy_key=proxy_key)
+
+            elif cached is not None:
+                cached_links, cached_limit = cached
+                print('캐시된 링크로 다운로드 : {} {} ({}개)'.format(keyword, site_name, len(cached_links)))
+                journal.add_links(keyword, site_name, cached_links)
+                journal.set_task_state(keyword, site_name, CrawlJournal.COLLECTED, link_limit=cached_limit)
+                self.download_images(keyword, cached_links, site_name, max_count=self.limit, proxy_key=proxy_key)
 
             else:
-                print('올바르지 않은 DNS 코드')
-                links = []
-
-            print('수집된 링크에서 이미지 다운로드 중 :{} {}'.format(keyword, site_name))
-            self.download_images(keyword, links, site_name, max_count=self.limit)
-            Path('{}/{}/{}_done'.format(self.download_path, keyword.replace('"', ''), site_name)).touch()
-
-            print('완료 {} : {}'.format(site_name, keyword))
+                # Until the results run out the links are only known up to candidate_limit.
+                journal.set_task_state(keyword, site_name, CrawlJournal.COLLECTING, link_limit=candidate_limit)
+
+                def collected(links):
+                    # Recorded as soon as the links ran out, with the links still queued for download, so a worker
+                    # that dies during the downloads does not have to scroll again. A list that was cut off covers
+                    # no more than the links it has; one cut off before it had any is not worth keeping.
+                    if collect.truncated and not links:
+                        return
+                    link_limit = len(links) if collect.truncated else 0
+                    journal.add_links(keyword, site_name, links)
+                    journal.set_task_state(keyword, site_name, CrawlJournal.COLLECTED, link_limit=link_limit)
+                    if cache:
+                        cache.put(cache_key, links, link_limit)
+
+                with self.lease_collector(proxy_key) as collect:
+                    print('링크 가져오는 중 : {} {} '.format(keyword, site_name))
+                    links = self.iter_links(collect, keyword, site_code, add_url, candidate_limit)
+
+                    # Downloads start as soon as the first links are scrolled into view; stopping the stream once
+                    # max_count is met also stops the browser from scrolling any further.
+                    stream = LinkStream(links, on_exhausted=collected)
+                    try:
+                        print('수집된 링크에서 이미지 다운로드 중 :{} {}'.format(keyword, site_name))
+                        self.download_images(keyword, stream, site_name, max_count=self.limit, capture=collect.capture,
+                                             proxy_key=proxy_key)
+                    finally:
+                        stream.stop()
+
+                    if collect.capture is not None:
+                        stats = collect.capture.stats
+                        print('브라우저 캡처 {} : 캡처 {}, 사용 {}, 다시 다운로드 {}, 한도 초과 {}'
+                              .format(keyword, stats['captured'], stats['hits'], stats['misses'], stats['dropped']))
+
+            if self.limit and journal.link_limit(keyword, site_name) and \
+                    journal.count(keyword, site_name) < self.limit:
+                # The links were cut off before --limit images came out of them; the next run collects further.
+                print('링크가 부족해 다음 실행에서 더 수집합니다 : {} {} ({}개)'
+                      .format(site_name, keyword, journal.count(keyword, site_name)))
+            else:
+                journal.set_task_state(keyword, site_name, CrawlJournal.DONE)
+                print('완료 {} : {}'.format(site_name, keyword))
 
         except Exception as e:
             print('예외 {}:{} - {}'.format(site_name, keyword, e))
+            raise
+        finally:
+            if proxy_key is not None:
+                self.proxy_pool.release(proxy_key)
+
+    def stream(self, keywords, concurrency=None, buffer=64):
+        # Library entry point: crawls every enabled site for keywords (any iterable, read lazily) on concurrency
+        # threads of this process and yields an ImageRecord per image as soon as it is downloaded, without writing
+        # anything to disk. At most buffer records wait for the consumer, a slow consumer holds the crawl back, and
+        # closing the generator stops it. Images are deduplicated by hash within a (keyword, site) task.
+        if self.rate_limiter is None:
+            self.rate_limiter = RateLimiter.local(page_rate=self.page_rate, image_rate=self.image_rate)
+        if self.proxy_list and self.proxy_pool is None:
+            self.proxy_pool = ProxyPool.local(self.proxy_list)
+        if not self.browserless and self.driver_path is None:
+            self.driver_path = resolve_driver_path()
+
+        tasks = ((keyword, site_code) for keyword in keywords for site_code in self.site_codes())
+        records = queue.Queue(maxsize=buffer)
+        stop = threading.Event()
+        lock = threading.Lock()
+        errors = []
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    records.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def work():
+            try:
+                while not stop.is_set():
+                    try:
+                        with lock:
+                            task = next(tasks, None)
+                    except Exception as e:
+                        errors.append(e)
+                        break
+                    if task is None:
+                        break
+
+                    keyword, site_code = task
+                    try:
+                        self.stream_task(keyword, site_code, put, stop)
+                    except Exception as e:
+                        print('예외 {}:{} - {}'.format(Sites.get_text(site_code), keyword, e))
+            finally:
+                put(_STREAM_DONE)
+
+        threads = [threading.Thread(target=work, daemon=True)
+                   for _ in range(concurrency or self.n_threads * self.tabs)]
+        for thread in threads:
+            thread.start()
 
-    def download(self, args):
-        self.download_from_site(keyword=args[0], site_code=args[1])
+        try:
+            running = len(threads)
+            while running:
+                item = records.get()
+                if item is _STREAM_DONE:
+                    running -= 1
+                    continue
+                yield item
+
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def stream_task(self, keyword, site_code, put, stop):
+        site_name = Sites.get_text(site_code)
+        add_url = Sites.get_face_url(site_code) if self.face else ""
+        proxy_key = (keyword, site_name) if self.proxy_pool is not None else None
+        metrics = get_metrics()
+        digests = set()
+        count = 0
+
+        try:
+            with self.lease_collector(proxy_key) as collect:
+                print('링크 가져오는 중 : {} {} '.format(keyword, site_name))
+                stream = LinkStream(self.iter_links(collect, keyword, site_code, add_url,
+                                                    int(self.limit * self.CANDIDATE_HEADROOM)))
+
+                def counted_links():
+                    for link in stream:
+                        metrics.inc('links_found', site_name)
+                        yield link
+
+                def fetch(link):
+                    sink = io.BytesIO()
+                    ext, size, digest = self.read_payload(link, site_name, sink, collect.capture, proxy_key)
+                    return ext, digest, sink
+
+                results = self.get_engine().run(fetch, counted_links())
+                try:
+                    for link, result, error in results:
+                        if error is not None:
+                            if isinstance(error, RejectedImage):
+                                metrics.inc('rejected', site_name)
+                            else:
+                                metrics.inc('invalid' if isinstance(error, InvalidImage) else 'failed', site_name)
+                            continue
+
+                        ext, digest, sink = result
+                        if digest in digests:
+                            metrics.inc('duplicates', site_name)
+                            continue
+                        digests.add(digest)
+
+                        url = None if link.startswith('data:') else link
+                        if not put(ImageRecord(keyword, site_name, url, ext, digest, sink.getbuffer())):
+                            break
+                        count += 1
+                        metrics.inc('images', site_name)
+
+                        if self.limit and count >= self.limit:
+                            break
+                finally:
+                    results.close()
+                    stream.stop()
+        finally:
+            if proxy_key is not None:
+                self.proxy_pool.release(proxy_key)
+
+        print('스트림 완료 {} : {} ({}개)'.format(site_name, keyword, count))
+
+    def lease_collector(self, proxy_key=None):
+        # A pooled browser, or the HTTP collector with --browserless; both have the CollectLinks interface.
+        if self.browserless:
+            proxy = self.proxy_pool.assign(proxy_key) if proxy_key is not None else None
+            # Shares the download engine's connection pool; the result pages come from the same hosts.
+            collector = HttpCollectLinks(proxy=proxy, session=self.get_engine().session,
+                                         rate_limiter=self.rate_limiter, search_urls=self.search_urls,
+                                         proxy_pool=self.proxy_pool)
+            return contextlib.nullcontext(collector)
+
+        # The full resolution viewers and the capture need the images, the lean profile keeps them then.
+        if self.tabs > 1:
+            pool = get_tab_pool(no_gui=self.no_gui, driver_path=self.driver_path, max_uses=self.browser_max_uses,
+                                profile=self.browser_profile, block_images=not self.full_resolution, tabs=self.tabs)
+        else:
+            pool = get_pool(no_gui=self.no_gui, driver_path=self.driver_path, max_uses=self.browser_max_uses,
+                            capture_images=self.capture_images, profile=self.browser_profile,
+                            block_images=not (self.full_resolution or self.capture_images))
+        # A healthy proxy that already has an idle browser saves a browser launch.
+        proxy = None
+        if proxy_key is not None:
+            proxy = self.proxy_pool.assign(proxy_key, prefer=pool.idle_proxies())
+        return pool.lease(proxy=proxy, rate_limiter=self.rate_limiter, search_urls=self.search_urls,
+                          proxy_pool=self.proxy_pool)
+
+    @staticmethod
+    def iter_links(collect, keyword, site_code, add_url="", limit=0):
+        if site_code == Sites.GOOGLE:
+            return collect.iter_google(keyword, add_url, limit=limit)
+        elif site_code == Sites.NAVER:
+            return collect.iter_naver(keyword, add_url, limit=limit)
+        elif site_code == Sites.GOOGLE_FULL:
+            return collect.iter_google_full(keyword, add_url, limit=limit)
+        elif site_code == Sites.NAVER_FULL:
+            return collect.iter_naver_full(keyword, add_url, limit=limit)
+
+        print('올바르지 않은 DNS 코드')
+        return iter([])
 
     def do_crawling(self):
         keywords = self.get_keywords()
 
+        manifest = self.get_manifest()
+        if not manifest.is_indexed():
+            print('기존 다운로드 폴더로 매니페스트를 만드는 중 . . .')
+            manifest.rebuild(self.download_path, skip=('shards',))
+
+        self.import_legacy_tasks(keywords)
+
+        journal = self.get_journal()
+        done = journal.done_tasks()
+
         tasks = []
 
         for keyword in keywords:
             dir_name = '{}/{}'.format(self.download_path, keyword)
-            google_done = os.path.exists(os.path.join(os.getcwd(), dir_name, 'google_done'))
-            naver_done = os.path.exists(os.path.join(os.getcwd(), dir_name, 'naver_done'))
-            if google_done and naver_done and self.skip:
+            google_done = (keyword, Sites.get_text(Sites.GOOGLE)) in done and self.skip and not self.delta
+            naver_done = (keyword, Sites.get_text(Sites.NAVER)) in done and self.skip and not self.delta
+            if google_done and naver_done:
                 print('완료된 작업 건너뛰기 : {}'.format(dir_name))
                 continue
 
@@ -252,57 +742,202 @@ class AutoCrawler:
                 else:
                     tasks.append([keyword, Sites.NAVER])
 
-        pool = Pool(self.n_threads)
-        pool.map_async(self.download, tasks)
-        pool.close()
-        pool.join()
-        print('작업이 끝났습니다.')
+        if not self.skip and not self.delta:
+            for keyword, site_code in tasks:
+                self.reset_task(keyword, Sites.get_text(site_code))
 
-        self.imbalance_check()
+        if not self.browserless:
+            try:
+                self.driver_path = resolve_driver_path()
+            except Exception as e:
+                print('크롬 드라이버를 불러오는 중 오류가 발생했습니다 - {}'.format(e))
+                return
 
-        print('프로그램을 종료합니다')
+        if self.output == 'shards' and os.path.isdir(self.shard_path()):
+            recovered = recover_shards(self.shard_path())
+            if recovered:
+                print('중단된 샤드 {}개를 마무리했습니다.'.format(recovered))
 
-    def imbalance_check(self):
-        print('데이터 패키징 중 . . .')
+        if self.queue_path:
+            self.run_queue(keywords)
+        else:
+            self.run_tasks(tasks)
+            print('작업이 끝났습니다.')
+            self.imbalance_check(self.expected_tasks(keywords))
+
+        manifest.export(os.path.join(self.download_path, 'manifest.json'))
 
-        dict_num_files = {}
+        print('프로그램을 종료합니다')
+
+    def import_legacy_tasks(self, keywords):
+        # Keyword directories from before the journal: a "<site>_done" marker (written as Google_done, looked for as
+        # google_done) is a finished task, and new files are numbered past the ones already there.
+        journal = self.get_journal()
+        for keyword in keywords:
+            dir_name = '{}/{}'.format(self.download_path.replace('"', ''), keyword.replace('"', ''))
+            if not os.path.isdir(dir_name):
+                continue
+            for site_name in (Sites.get_text(Sites.GOOGLE), Sites.get_text(Sites.NAVER)):
+                if journal.task_state(keyword, site_name) is not None:
+                    continue
+                floor = self.next_file_index(keyword, site_name)
+                if floor > 0:
+                    journal.set_index_floor(keyword, site_name, floor)
+                markers = [os.path.join(dir_name, name + '_done') for name in (site_name, site_name.lower())]
+                if any(os.path.exists(marker) for marker in markers):
+                    print('이전 버전의 완료 표시 가져오기 : {} {}'.format(keyword, site_name))
+                    journal.set_task_state(keyword, site_name, CrawlJournal.DONE)
+
+    def reset_task(self, keyword, site_name):
+        # Starts the task over: its files get overwritten from index 0 on, so the content index must not keep them
+        # as stored copies (every link would come out as a duplicate and old file names would be reused).
+        self.get_journal().reset_task(keyword, site_name)
+        index = self.get_content_index()
+        if index is not None:
+            index.forget(self.get_manifest().files(keyword, site_name),
+                         '{}/{}'.format(self.download_path.replace('"', ''), keyword))
+
+    def site_codes(self):
+        codes = []
+        if self.do_google:
+            codes.append(Sites.GOOGLE_FULL if self.full_resolution else Sites.GOOGLE)
+        if self.do_naver:
+            codes.append(Sites.NAVER_FULL if self.full_resolution else Sites.NAVER)
+        return codes
+
+    def expected_tasks(self, keywords):
+        return [[keyword, site_code] for keyword in keywords for site_code in self.site_codes()]
+
+    def run_queue(self, keywords):
+        # Several nodes share one work queue on shared storage. Every node may seed it with its keywords (tasks
+        # that are already queued or done are left alone), then leases tasks until no node has anything left.
+        queue = WorkQueue(self.queue_path, node_id=self.node_id, lease_time=self.lease_time)
+        try:
+            # Leases held by an earlier run of this node (killed, or its machine rebooted) are handed back first.
+            queue.release()
+            for keyword, site_code in self.expected_tasks(keywords):
+                queue.add(keyword, site_code, Sites.get_text(site_code))
+            print('작업 큐 : {}, 노드 : {}, 상태 : {}'.format(self.queue_path, queue.node_id, queue.counts()))
+
+            self.run_tasks([], source=queue)
+            print('작업이 끝났습니다. 작업 큐 상태 : {}'.format(queue.counts()))
+
+            self.merge_manifest(queue)
+        finally:
+            queue.close()
+
+    def merge_manifest(self, queue):
+        # The files of the tasks this node completed go into one manifest next to the queue, under "<node>:<path>".
+        # Files of tasks that were taken over by another node after a lease ran out are left out, so every
+        # (keyword, site) in the merged manifest comes from exactly one node.
+        shared_path = os.path.join(os.path.dirname(os.path.abspath(self.queue_path)), 'manifest.sqlite')
+        shared = Manifest(shared_path, shared=True)
+        try:
+            merged = shared.merge(self.get_manifest().path, prefix='{}:'.format(queue.node_id),
+                                  tasks=queue.completed_by())
+            shared.export(os.path.splitext(shared_path)[0] + '.json')
+        finally:
+            shared.close()
+        print('공유 매니페스트에 파일 {}개를 합쳤습니다 : {}'.format(merged, shared_path))
+
+    def run_tasks(self, tasks, source=None):
+        profile_dir = None
+        if self.profile:
+            profile_dir = os.path.join(self.download_path, '.profile')
+            os.makedirs(profile_dir, exist_ok=True)
+
+        self.rate_limiter = RateLimiter.shared(page_rate=self.page_rate, image_rate=self.image_rate)
+        if self.proxy_list:
+            self.proxy_pool = ProxyPool.shared(self.proxy_list)
+            self.proxy_pool.start_prober()
+
+        scheduler = Scheduler(self, n_workers=self.n_threads, site_limits=self.site_limits,
+                              task_timeout=self.task_timeout, max_retries=self.max_retries, profile_dir=profile_dir,
+                              source=source, slots=1 if self.browserless else self.tabs)
+        for keyword, site_code in tasks:
+            scheduler.add(keyword, site_code, Sites.get_text(site_code))
+        try:
+            self.summary = scheduler.run()
+        finally:
+            self.rate_limiter.shutdown()
+            self.rate_limiter = None
+            if self.proxy_pool is not None:
+                self.proxy_pool.summary()
+                self.proxy_pool.shutdown()
+                self.proxy_pool = None
+
+        self.write_report(scheduler.metrics)
+        if profile_dir:
+            print('프로파일 저장 위치 : {} (python -m pstats 로 확인)'.format(profile_dir))
+
+    def write_report(self, metrics):
+        json_path = os.path.join(self.download_path, '.run_report.json')
+        prom_path = os.path.join(self.download_path, '.metrics.prom')
+        report = metrics.write_report(json_path, prom_path, self.summary['elapsed'], extra={'tasks': self.summary})
+
+        for site, counters in sorted(report['sites'].items()):
+            print('{} - 링크 : {}, 이미지 : {} ({:.2f}/s), 다운로드 : {:.1f}MB, 중복 : {}, 변경 없음 : {}, 제외 : {}, '
+                  '오류 : {}, 실패 : {}, 재시도 : {}'
+                  .format(site, counters['links_found'], counters['images'], counters['images_per_second'],
+                          counters['bytes_downloaded'] / 1024 / 1024, counters['duplicates'], counters['unchanged'],
+                          counters['rejected'], counters['invalid'], counters['failed'], counters['retries']))
+        print('실행 보고서 : {}, {}'.format(json_path, prom_path))
+
+    def under_filled(self, expected):
+        # Returns (target, [(keyword, site_code, n_files)]) from the manifest totals, without touching the disk.
+        totals = self.get_manifest().totals()
+        counts = [(keyword, site_code, totals.get((keyword, Sites.get_text(site_code)), (0, 0))[0])
+                  for keyword, site_code in expected]
+
+        target = self.rebalance_target or self.limit
+        if not target and counts:
+            target = sum(n_files for _, _, n_files in counts) / len(counts) * 0.5
+
+        return target, [(keyword, site_code, n_files) for keyword, site_code, n_files in counts if n_files < target]
+
+    def imbalance_check(self, expected):
+        if self.rebalance == 'off':
+            return
 
-        for dir in self.all_dirs(self.download_path):
-            n_files = len(self.all_files(dir))
-            dict_num_files[dir] = n_files
+        print('데이터 패키징 중 . . .')
 
-        avg = 0
-        for dir, n_files in dict_num_files.items():
-            avg += n_files / len(dict_num_files)
-            print('파일 위치 : {}, 파일 개수 : {}'.format(dir, n_files))
+        for (keyword, site), (n_files, size) in sorted(self.get_manifest().totals().items()):
+            print('키워드 : {}, 사이트 : {}, 파일 개수 : {}, 크기 : {:.1f}MB'.format(keyword, site, n_files,
+                                                                        size / 1024 / 1024))
 
-        dict_too_small = {}
+        target, too_small = self.under_filled(expected)
 
-        for dir, n_files in dict_num_files.items():
-            if n_files < avg * 0.5:
-                dict_too_small[dir] = n_files
+        if not too_small:
+            print('데이터 불균형이 없습니다.')
+            return
 
-        if len(dict_too_small) >= 1:
-            print('데이터 밸런스가 맞지 않습니다.')
-            print('아래 키워드는 평균 파일 수의 50% 미만입니다.')
-            print('이 디렉토리를 제거하고 해당 키워드에 대해 다시 다운로드하는 것이 좋습니다.')
-            print('_________________________________')
-            print('너무 작은 파일 수 디렉토리 :')
-            for dir, n_files in dict_too_small.items():
-                print('위치 : {}, 파일 개수 : {}'.format(dir, n_files))
+        print('데이터 밸런스가 맞지 않습니다.')
+        print('아래 키워드는 목표 파일 수({:.0f}) 미만입니다.'.format(target))
+        print('_________________________________')
+        for keyword, site_code, n_files in too_small:
+            print('키워드 : {}, 사이트 : {}, 파일 개수 : {}'.format(keyword, Sites.get_text(site_code), n_files))
 
-            print("위의 디렉토리 제거? (y/n)")
-            answer = input()
+        if self.rebalance != 'requeue':
+            print('--rebalance requeue 옵션으로 부족한 키워드를 자동으로 다시 수집할 수 있습니다.')
+            return
 
-            if answer == 'y':
-                print("너무 작은 파일 수 디렉토리 제거 중...")
-                for dir, n_files in dict_too_small.items():
-                    shutil.rmtree(dir)
-                    print('삭제함 : {}'.format(dir))
+        # Another scheduler round over the under-filled tasks only. Links are collected again (bypassing the link
+        # cache) so the journal can pick up new results and retry failed ones; downloads stop at the target. The
+        # collection goes past the links the journal already has (see candidate_limit), a delta recrawl already
+        # revalidated those.
+        print('부족한 키워드를 다시 수집합니다 : {}개 작업'.format(len(too_small)))
+        refresh_links, limit, delta = self.refresh_links, self.limit, self.delta
+        self.refresh_links = True
+        self.limit = int(self.rebalance_target or self.limit)
+        self.delta = False
+        try:
+            self.run_tasks([[keyword, site_code] for keyword, site_code, _ in too_small])
+        finally:
+            self.refresh_links, self.limit, self.delta = refresh_links, limit, delta
 
-                print('이제 이 프로그램을 다시 실행하여 제거된 파일을 다시 다운로드하십시오. (with skip_already_exist=True)')
-        else:
-            print('데이터 불균형이 감지되었습니다.')
+        target, too_small = self.under_filled(expected)
+        for keyword, site_code, n_files in too_small:
+            print('여전히 부족함 : {} {} ({}개)'.format(keyword, Sites.get_text(site_code), n_files))
 
 
 if __name__ == '__main__':
@@ -324,6 +959,67 @@ if __name__ == '__main__':
     parser.add_argument('--proxy-list', type=str, default='',
                         help='"socks://127.0.0.1:1080,http://127.0.0.1:1081"과 같이 쉼표로 구분된 프록시 목록 ". '
                              '모든 스레드는 목록에서 무작위로 하나를 선택합니다.')
+    parser.add_argument('--browser-max-uses', type=int, default=20,
+                        help='브라우저 세션을 교체하기 전에 재사용할 최대 작업 수입니다.')
+    parser.add_argument('--download-workers', type=int, default=16,
+                        help='프로세스당 동시에 진행할 최대 이미지 다운로드 수입니다.')
+    parser.add_argument('--per-host', type=int, default=6,
+                        help='호스트당 동시에 진행할 최대 이미지 다운로드 수입니다.')
+    parser.add_argument('--dedup', type=str, default='link', choices=['off', 'drop', 'link'],
+                        help='download 전체에서 중복 이미지 처리 방법입니다. drop: 건너뛰기, link: 하드 링크. '
+                             'Pillow가 설치되어 있으면 비슷한 이미지도 중복으로 처리합니다.')
+    parser.add_argument('--link-cache-ttl', type=int, default=7 * 24 * 3600,
+                        help='수집된 링크 목록을 캐시에 보관하는 시간(초)입니다. (0: 캐시 사용 안 함)')
+    parser.add_argument('--link-cache-size', type=int, default=512, help='링크 캐시의 최대 크기(MB)입니다.')
+    parser.add_argument('--refresh-links', type=str, default='false',
+                        help='캐시와 저널의 링크 목록을 무시하고 브라우저로 링크를 다시 수집합니다.')
+    parser.add_argument('--max-size', type=int, default=50,
+                        help='이미지 하나의 최대 크기(MB)입니다. 초과하면 다운로드를 중단합니다. (0: 무한)')
+    parser.add_argument('--min-width', type=int, default=0,
+                        help='이미지의 최소 가로 크기(px)입니다. 헤더에서 크기를 읽어 작으면 다운로드를 중단합니다. (0: 제한 없음)')
+    parser.add_argument('--min-height', type=int, default=0, help='이미지의 최소 세로 크기(px)입니다. (0: 제한 없음)')
+    parser.add_argument('--max-width', type=int, default=0, help='이미지의 최대 가로 크기(px)입니다. (0: 제한 없음)')
+    parser.add_argument('--max-height', type=int, default=0, help='이미지의 최대 세로 크기(px)입니다. (0: 제한 없음)')
+    parser.add_argument('--max-aspect', type=float, default=0,
+                        help='긴 변과 짧은 변의 최대 비율입니다. 예: 3 이면 3:1 보다 길쭉한 이미지를 제외합니다. (0: 제한 없음)')
+    parser.add_argument('--formats', type=str, default='',
+                        help='"jpg,png"와 같이 받을 이미지 형식입니다. (기본: 모든 형식)')
+    parser.add_argument('--site-limits', type=str, default='',
+                        help='"google=2,naver=4"와 같이 사이트별 동시 작업 수 제한입니다. (기본: 제한 없음)')
+    parser.add_argument('--task-timeout', type=int, default=1200,
+                        help='작업 하나의 최대 시간(초)입니다. 초과하면 워커와 크롬을 종료하고 재시도합니다. (0: 무한)')
+    parser.add_argument('--retries', type=int, default=2, help='실패한 작업을 다시 시도하는 최대 횟수입니다.')
+    parser.add_argument('--page-rate', type=float, default=0.5,
+                        help='모든 프로세스를 합친 호스트당 초당 검색 페이지 요청 수입니다. (0: 제한 없음)')
+    parser.add_argument('--image-rate', type=float, default=10,
+                        help='모든 프로세스를 합친 호스트당 초당 이미지 요청 수입니다. (0: 제한 없음)')
+    parser.add_argument('--profile', type=str, default='false',
+                        help='워커 프로세스마다 cProfile 결과를 download/.profile 에 저장합니다.')
+    parser.add_argument('--rebalance', type=str, default='report', choices=['off', 'report', 'requeue'],
+                        help='작업 후 파일 수가 부족한 키워드 처리 방법입니다. report: 출력만, requeue: 목표 수까지 다시 수집')
+    parser.add_argument('--rebalance-target', type=int, default=0,
+                        help='키워드/사이트당 목표 파일 수입니다. (0: --limit, 없으면 평균의 50%%)')
+    parser.add_argument('--capture-images', type=str, default='false',
+                        help='브라우저가 이미 받은 이미지를 DevTools로 가져와 다시 다운로드하지 않습니다.')
+    parser.add_argument('--output', type=str, default='files', choices=['files', 'shards'],
+                        help='files: 키워드 폴더에 이미지 파일로 저장, shards: download/shards 에 묶음 파일로 저장')
+    parser.add_argument('--shard-size', type=int, default=1024, help='샤드 파일 하나의 최대 크기(MB)입니다.')
+    parser.add_argument('--browserless', type=str, default='false',
+                        help='크롬 없이 HTTP로 검색 결과 페이지를 받아 링크를 수집합니다. 썸네일 수집에 알맞습니다.')
+    parser.add_argument('--browser-profile', type=str, default='default', choices=['default', 'lean'],
+                        help='lean: 링크 수집 중 글꼴, CSS, 미디어, 추적 요청과 (가능하면) 이미지를 차단하고 메모리를 제한합니다.')
+    parser.add_argument('--tabs', type=int, default=1,
+                        help='워커마다 크롬 하나의 여러 창에서 동시에 수집할 키워드 수입니다. 동시 작업 수는 --threads x --tabs 가 '
+                             '되며, 크롬 프로세스 메모리를 나눠 씁니다. (--capture-images 와 함께 사용할 수 없음)')
+    parser.add_argument('--delta', type=str, default='false',
+                        help='완료된 키워드도 다시 수집하되 새 링크만 받고, 이미 받은 이미지는 조건부 요청(ETag/Last-Modified)으로 '
+                             '변경된 경우에만 다시 받습니다. 파일 번호는 기존 파일 다음부터 이어집니다.')
+    parser.add_argument('--queue', type=str, default='',
+                        help='여러 컴퓨터가 나눠서 작업할 공유 작업 큐(SQLite) 경로입니다. 예: /mnt/shared/queue.sqlite')
+    parser.add_argument('--node-id', type=str, default='',
+                        help='작업 큐에서 이 노드의 이름입니다. 기본값은 호스트 이름이며, 한 컴퓨터에서 여러 개를 실행할 때 지정합니다.')
+    parser.add_argument('--lease-time', type=int, default=300,
+                        help='작업 임대 시간(초)입니다. 이 시간 동안 응답이 없는 노드의 작업은 다른 노드가 가져갑니다.')
     args = parser.parse_args()
 
     _skip = False if str(args.skip).lower() == 'false' else True
@@ -334,6 +1030,38 @@ if __name__ == '__main__':
     _face = False if str(args.face).lower() == 'false' else True
     _limit = int(args.limit)
     _proxy_list = args.proxy_list.split(',')
+    _browser_max_uses = args.browser_max_uses
+    _download_workers = args.download_workers
+    _per_host = args.per_host
+    _dedup = args.dedup
+    _link_cache_ttl = args.link_cache_ttl
+    _link_cache_size = args.link_cache_size
+    _refresh_links = False if str(args.refresh_links).lower() == 'false' else True
+    _max_bytes = args.max_size * 1024 * 1024
+    _image_filter = ImageFilter(min_width=args.min_width, min_height=args.min_height, max_width=args.max_width,
+                                max_height=args.max_height, max_aspect=args.max_aspect,
+                                formats=ImageFilter.parse_formats(args.formats))
+    _site_limits = {}
+    for item in filter(None, args.site_limits.split(',')):
+        site, limit = item.split('=')
+        _site_limits[site.strip().capitalize()] = int(limit)
+    _task_timeout = args.task_timeout
+    _retries = args.retries
+    _page_rate = args.page_rate
+    _image_rate = args.image_rate
+    _profile = False if str(args.profile).lower() == 'false' else True
+    _rebalance = args.rebalance
+    _rebalance_target = args.rebalance_target
+    _capture_images = False if str(args.capture_images).lower() == 'false' else True
+    _output = args.output
+    _shard_size = args.shard_size * 1024 * 1024
+    _queue = args.queue or None
+    _node_id = args.node_id or None
+    _lease_time = args.lease_time
+    _browserless = False if str(args.browserless).lower() == 'false' else True
+    _browser_profile = args.browser_profile
+    _delta = False if str(args.delta).lower() == 'false' else True
+    _tabs = args.tabs
 
     no_gui_input = str(args.no_gui).lower()
     if no_gui_input == 'auto':
@@ -349,5 +1077,14 @@ if __name__ == '__main__':
 
     crawler = AutoCrawler(skip_already_exist=_skip, n_threads=_threads,
                           do_google=_google, do_naver=_naver, full_resolution=_full,
-                          face=_face, no_gui=_no_gui, limit=_limit, proxy_list=_proxy_list)
+                          face=_face, no_gui=_no_gui, limit=_limit, proxy_list=_proxy_list,
+                          browser_max_uses=_browser_max_uses, download_workers=_download_workers,
+                          per_host_connections=_per_host, dedup=_dedup, link_cache_ttl=_link_cache_ttl,
+                          link_cache_size=_link_cache_size, refresh_links=_refresh_links, max_bytes=_max_bytes,
+                          site_limits=_site_limits, task_timeout=_task_timeout, max_retries=_retries,
+                          page_rate=_page_rate, image_rate=_image_rate, profile=_profile,
+                          rebalance=_rebalance, rebalance_target=_rebalance_target, capture_images=_capture_images,
+                          output=_output, shard_size=_shard_size, queue_path=_queue, node_id=_node_id,
+                          lease_time=_lease_time, browserless=_browserless,
+                          browser_profile=_browser_profile, delta=_delta, image_filter=_image_filter, tabs=_tabs)
     crawler.do_crawling()
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class Manifest:
+    # Every stored file with its size and hash, plus running per (keyword, site) totals that are updated in the same
+    # transaction, so dataset statistics never need a directory walk.
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        # WAL needs shared memory between the connections, so a manifest on network storage uses a rollback journal.
+        self.conn.execute('PRAGMA journal_mode={}'.format('DELETE' if shared else 'WAL'))
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                keyword TEXT NOT NULL,
+                site TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                sha256 TEXT,
+                added REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS totals (
+                keyword TEXT NOT NULL,
+                site TEXT NOT NULL,
+                files INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                PRIMARY KEY (keyword, site)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        ''')
+        self.conn.commit()
+
+    def add_total(self, keyword, site, files, size):
+        self.conn.execute('INSERT OR IGNORE INTO totals (keyword, site, files, bytes) VALUES (?, ?, 0, 0)',
+                          (keyword, site))
+        self.conn.execute('UPDATE totals SET files = files + ?, bytes = bytes + ? WHERE keyword = ? AND site = ?',
+                          (files, size, keyword, site))
+
+    def add(self, keyword, site, path, size, digest=None):
+        with self.lock:
+            old = self.conn.execute('SELECT keyword, site, bytes FROM files WHERE path = ?', (path,)).fetchone()
+            if old is not None:
+                # Overwritten in place, e.g. after --skip false restarted the numbering.
+                self.add_total(old[0], old[1], -1, -old[2])
+            self.conn.execute('INSERT OR REPLACE INTO files (path, keyword, site, bytes, sha256, added) '
+                              'VALUES (?, ?, ?, ?, ?, ?)', (path, keyword, site, size, digest, time.time()))
+            self.add_total(keyword, site, 1, size)
+            self.conn.commit()
+
+    def remove(self, path):
+        with self.lock:
+            old = self.conn.execute('SELECT keyword, site, bytes FROM files WHERE path = ?', (path,)).fetchone()
+            if old is None:
+                return False
+            self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+            self.add_total(old[0], old[1], -1, -old[2])
+            self.conn.commit()
+            return True
+
+    def totals(self):
+        # {(keyword, site): (files, bytes)}
+        with self.lock:
+            rows = self.conn.execute('SELECT keyword, site, files, bytes FROM totals WHERE files > 0').fetchall()
+        return {(keyword, site): (files, size) for keyword, site, files, size in rows}
+
+    def count(self, keyword, site):
+        with self.lock:
+            row = self.conn.execute('SELECT files FROM totals WHERE keyword = ? AND site = ?',
+                                    (keyword, site)).fetchone()
+        return row[0] if row else 0
+
+    def files(self, keyword, site):
+        # [(path, sha256)]
+        with self.lock:
+            return self.conn.execute('SELECT path, sha256 FROM files WHERE keyword = ? AND site = ?',
+                                     (keyword, site)).fetchall()
+
+    def is_indexed(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'indexed'").fetchone()
+        return row is not None
+
+    def rebuild(self, root, skip=()):
+        # One-time import of a download directory that predates the manifest. File names are "<site>_<index>.<ext>";
+        # hashes are left empty because reading every file back is exactly what the manifest is meant to avoid.
+        with self.lock:
+            self.conn.execute('DELETE FROM files')
+            self.conn.execute('DELETE FROM totals')
+
+            for keyword_entry in os.scandir(root):
+                if keyword_entry.name.startswith('.') or keyword_entry.name in skip or not keyword_entry.is_dir():
+                    continue
+                for dir_path, dir_names, file_names in os.walk(keyword_entry.path):
+                    for file_name in file_names:
+                        # Hidden temp files and the "<site>_done" markers of older versions are not images.
+                        if file_name.startswith('.') or file_name.endswith(('.part', '_done')):
+                            continue
+                        path = os.path.join(dir_path, file_name)
+                        site = file_name.split('_', 1)[0]
+                        size = os.path.getsize(path)
+                        self.conn.execute('INSERT OR REPLACE INTO files (path, keyword, site, bytes, sha256, added) '
+                                          'VALUES (?, ?, ?, ?, NULL, ?)',
+                                          (path, keyword_entry.name, site, size, time.time()))
+                        self.add_total(keyword_entry.name, site, 1, size)
+
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed', ?)", (str(time.time()),))
+            self.conn.commit()
+
+    def merge(self, other_path, prefix='', tasks=None):
+        # Replaces everything previously merged under prefix with the files of another manifest (one node's), limited
+        # to the given (keyword, site) pairs. Totals are recounted afterwards, merging is rare and runs in one go.
+        other = sqlite3.connect(other_path, timeout=60)
+        try:
+            rows = other.execute('SELECT path, keyword, site, bytes, sha256, added FROM files').fetchall()
+        finally:
+            other.close()
+
+        with self.lock:
+            self.conn.execute('DELETE FROM files WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+            merged = 0
+            for path, keyword, site, size, digest, added in rows:
+                if tasks is not None and (keyword, site) not in tasks:
+                    continue
+                self.conn.execute('INSERT OR REPLACE INTO files (path, keyword, site, bytes, sha256, added) '
+                                  'VALUES (?, ?, ?, ?, ?, ?)', (prefix + path, keyword, site, size, digest, added))
+                merged += 1
+
+            self.conn.execute('DELETE FROM totals')
+            self.conn.execute('INSERT INTO totals (keyword, site, files, bytes) '
+                              'SELECT keyword, site, COUNT(*), SUM(bytes) FROM files GROUP BY keyword, site')
+            self.conn.commit()
+        return merged
+
+    def export(self, json_path):
+        # Summary only; the per-file list (paths, sizes, hashes) stays queryable in the SQLite file.
+        keywords = {}
+        for (keyword, site), (files, size) in sorted(self.totals().items()):
+            keywords.setdefault(keyword, {})[site] = {'files': files, 'bytes': size}
+
+        tmp_path = '{}.{}.tmp'.format(json_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'updated': time.time(), 'keywords': keywords}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, json_path)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_process_manifests = {}
+
+
+def get_manifest(path, shared=False):
+    # Keyed by pid as well: a SQLite connection must not be shared with forked workers.
+    key = (path, os.getpid())
+    if key not in _process_manifests:
+        _process_manifests[key] = Manifest(path, shared=shared)
+    return _process_manifests[key]
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of the phase histograms, shared by the JSON report and the Prometheus export.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+COUNTERS = ('links_found', 'bytes_downloaded', 'images', 'captured', 'duplicates', 'unchanged', 'rejected', 'invalid',
+            'failed', 'retries', 'timeouts')
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.counters = {}
+
+    def observe(self, phase, seconds, cpu=0.0):
+        index = len(BUCKETS)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                index = i
+                break
+
+        with self.lock:
+            if phase not in self.phases:
+                self.phases[phase] = self.new_histogram()
+            h = self.phases[phase]
+            h['count'] += 1
+            h['sum'] += seconds
+            h['cpu'] += cpu
+            h['max'] = max(h['max'], seconds)
+            h['buckets'][index] += 1
+
+    @staticmethod
+    def new_histogram():
+        return {'count': 0, 'sum': 0.0, 'cpu': 0.0, 'max': 0.0, 'buckets': [0] * (len(BUCKETS) + 1)}
+
+    @contextmanager
+    def timer(self, phase):
+        # CPU time is taken per thread, so concurrent downloads do not count each other's work.
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start, time.thread_time() - start_cpu)
+
+    def inc(self, name, site, value=1):
+        with self.lock:
+            key = (name, site)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def drain(self):
+        # Hands the data collected since the last drain to the caller, e.g. a worker reporting back per task.
+        with self.lock:
+            snapshot = {'phases': self.phases, 'counters': self.counters}
+            self.phases = {}
+            self.counters = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        with self.lock:
+            for phase, other in snapshot['phases'].items():
+                if phase not in self.phases:
+                    self.phases[phase] = self.new_histogram()
+                h = self.phases[phase]
+                h['count'] += other['count']
+                h['sum'] += other['sum']
+                h['cpu'] += other['cpu']
+                h['max'] = max(h['max'], other['max'])
+                h['buckets'] = [a + b for a, b in zip(h['buckets'], other['buckets'])]
+
+            for key, value in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def site_counters(self):
+        with self.lock:
+            sites = {}
+            for (name, site), value in self.counters.items():
+                sites.setdefault(site, dict.fromkeys(COUNTERS, 0))[name] = value
+        return sites
+
+    def as_dict(self, elapsed):
+        with self.lock:
+            phases = {}
+            for phase, h in sorted(self.phases.items()):
+                phases[phase] = {'count': h['count'], 'sum': round(h['sum'], 6), 'cpu': round(h['cpu'], 6),
+                                 'max': round(h['max'], 6),
+                                 'mean': round(h['sum'] / h['count'], 6) if h['count'] else 0.0,
+                                 'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], h['buckets']))}
+
+        sites = self.site_counters()
+        for counters in sites.values():
+            counters['links_per_second'] = round(counters['links_found'] / elapsed, 3) if elapsed else 0.0
+            counters['images_per_second'] = round(counters['images'] / elapsed, 3) if elapsed else 0.0
+            counters['bytes_per_second'] = round(counters['bytes_downloaded'] / elapsed, 1) if elapsed else 0.0
+
+        return {'elapsed': round(elapsed, 3), 'phases': phases, 'sites': sites}
+
+    def prometheus(self, elapsed):
+        lines = ['# HELP autocrawler_phase_seconds Time spent in each crawl phase.',
+                 '# TYPE autocrawler_phase_seconds histogram']
+
+        with self.lock:
+            for phase, h in sorted(self.phases.items()):
+                cumulative = 0
+                for bound, n in zip([str(b) for b in BUCKETS] + ['+Inf'], h['buckets']):
+                    cumulative += n
+                    lines.append('autocrawler_phase_seconds_bucket{{phase="{}",le="{}"}} {}'
+                                 .format(phase, bound, cumulative))
+                lines.append('autocrawler_phase_seconds_sum{{phase="{}"}} {}'.format(phase, h['sum']))
+                lines.append('autocrawler_phase_seconds_count{{phase="{}"}} {}'.format(phase, h['count']))
+
+            lines.append('# HELP autocrawler_phase_cpu_seconds_total CPU time of the crawler itself in each phase.')
+            lines.append('# TYPE autocrawler_phase_cpu_seconds_total counter')
+            for phase, h in sorted(self.phases.items()):
+                lines.append('autocrawler_phase_cpu_seconds_total{{phase="{}"}} {}'.format(phase, h['cpu']))
+
+        sites = self.site_counters()
+        for name in COUNTERS:
+            lines.append('# TYPE autocrawler_{}_total counter'.format(name))
+            for site, counters in sorted(sites.items()):
+                lines.append('autocrawler_{}_total{{site="{}"}} {}'.format(name, site, counters[name]))
+
+        lines.append('# TYPE autocrawler_run_seconds gauge')
+        lines.append('autocrawler_run_seconds {}'.format(elapsed))
+        lines.append('# TYPE autocrawler_last_run_timestamp_seconds gauge')
+        lines.append('autocrawler_last_run_timestamp_seconds {}'.format(int(time.time())))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def write_atomic(path, text):
+        # Scrapers (e.g. the node_exporter textfile collector) must never see a half written file.
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def write_report(self, json_path, prom_path, elapsed, extra=None):
+        report = self.as_dict(elapsed)
+        report.update(extra or {})
+        self.write_atomic(json_path, json.dumps(report, ensure_ascii=False, indent=2))
+        self.write_atomic(prom_path, self.prometheus(elapsed))
+        return report
+
+
+_process_metrics = None
+_process_metrics_pid = None
+
+
+def get_metrics():
+    # Re-created after a fork, so a worker never reports what its parent had collected.
+    global _process_metrics, _process_metrics_pid
+    if _process_metrics is None or _process_metrics_pid != os.getpid():
+        _process_metrics = Metrics()
+        _process_metrics_pid = os.getpid()
+    return _process_metrics
@@ -0,0 +1,85 @@
+import queue
+import threading
+
+
+_END = object()
+
+
+class LinkStream:
+    def __init__(self, links, maxsize=256, on_exhausted=None):
+        self.links = links
+        # Called from the producer thread with the whole list once the links ran out, before the consumer has
+        # necessarily seen all of them.
+        self.on_exhausted = on_exhausted
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.produce, daemon=True)
+        self.error = None
+        self.count = 0
+        self.exhausted = False
+        self.collected = []
+
+    def put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(self):
+        try:
+            for link in self.links:
+                if not self.put(link):
+                    break
+                self.collected.append(link)
+                self.count += 1
+            else:
+                self.exhausted = True
+                if self.on_exhausted is not None:
+                    self.on_exhausted(self.collected)
+        except Exception as e:
+            self.error = e
+        finally:
+            if hasattr(self.links, 'close'):
+                self.links.close()
+            self.put(_END)
+
+    def __iter__(self):
+        if self.thread.ident is None:
+            self.thread.start()
+
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                break
+            yield item
+
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.ident is not None:
+            self.thread.join()
+
+        # Wake up a consumer that may still be blocked on the queue.
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.queue.put_nowait(_END)
+
+
+class ImageRecord:
+    # One image yielded by AutoCrawler.stream(). data is a memoryview over the downloaded bytes, bytes(data) copies
+    # it; url is None for images that were embedded in the result page as data URIs.
+    def __init__(self, keyword, site, url, format, sha256, data):
+        self.keyword = keyword
+        self.site = site
+        self.url = url
+        self.format = format
+        self.sha256 = sha256
+        self.data = data
@@ -0,0 +1,216 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+import requests
+
+
+class NoHealthyProxy(Exception):
+    pass
+
+
+def proxy_url(proxy):
+    # --proxy-list entries are "host:port" as Chrome takes them; requests wants a scheme.
+    return proxy if '://' in proxy else 'http://' + proxy
+
+
+class ProxyPoolState:
+    # Health of every proxy from live traffic and probes: latency and error rate as moving averages. A proxy whose
+    # error rate gets too high is quarantined for a while (twice as long every time) and evicted for the rest of the
+    # run after EVICT_STRIKES quarantines. Tasks keep their proxy (sticky) as long as it stays healthy.
+    EWMA = 0.2
+    MIN_SAMPLES = 4
+    MAX_ERROR_RATE = 0.5
+    QUARANTINE = 60.0
+    MAX_QUARANTINE = 1800.0
+    EVICT_STRIKES = 5
+
+    def __init__(self, proxies):
+        self.lock = threading.Lock()
+        self.proxies = {proxy: {'latency': 1.0, 'error_rate': 0.0, 'samples': 0, 'ok': 0, 'failed': 0, 'tasks': 0,
+                                'quarantined_until': 0.0, 'strikes': 0, 'probation': False, 'evicted': False}
+                        for proxy in dict.fromkeys(proxies)}
+        self.sticky = {}
+
+    def healthy(self, proxy, now):
+        p = self.proxies[proxy]
+        return not p['evicted'] and p['quarantined_until'] <= now
+
+    @staticmethod
+    def score(p):
+        # Lower is better: slow or flaky proxies and proxies already serving many tasks are picked less often.
+        return p['latency'] * (1 + 4 * p['error_rate']) * (1 + p['tasks'])
+
+    def assign(self, key, prefer=()):
+        # Returns the proxy of task key, choosing a new one when the task has none or its proxy went bad. Healthy
+        # proxies in prefer (e.g. the ones with an idle browser) win, otherwise the better of two random picks.
+        with self.lock:
+            now = time.time()
+            proxy = self.sticky.get(key)
+            if proxy is not None and self.healthy(proxy, now):
+                return proxy
+            if proxy is not None:
+                self.proxies[proxy]['tasks'] -= 1
+                del self.sticky[key]
+
+            candidates = [proxy for proxy in self.proxies if self.healthy(proxy, now)]
+            if not candidates:
+                return None
+
+            preferred = [proxy for proxy in prefer if proxy in candidates]
+            if preferred:
+                proxy = min(preferred, key=lambda proxy: self.score(self.proxies[proxy]))
+            else:
+                picks = random.sample(candidates, min(2, len(candidates)))
+                proxy = min(picks, key=lambda proxy: self.score(self.proxies[proxy]))
+
+            self.sticky[key] = proxy
+            self.proxies[proxy]['tasks'] += 1
+            return proxy
+
+    def release(self, key):
+        with self.lock:
+            proxy = self.sticky.pop(key, None)
+            if proxy is not None:
+                self.proxies[proxy]['tasks'] -= 1
+
+    def feedback(self, proxy, ok, latency=None, probe=False):
+        # A failed probe quarantines right away; live traffic needs a few samples, single errors are normal there.
+        with self.lock:
+            p = self.proxies.get(proxy)
+            if p is None:
+                return
+
+            p['samples'] += 1
+            p['ok' if ok else 'failed'] += 1
+            p['error_rate'] += self.EWMA * ((0.0 if ok else 1.0) - p['error_rate'])
+            if ok and latency is not None:
+                p['latency'] += self.EWMA * (latency - p['latency'])
+            if ok:
+                p['probation'] = False
+
+            failing = probe or (p['samples'] >= self.MIN_SAMPLES and p['error_rate'] > self.MAX_ERROR_RATE)
+            if not ok and failing and p['quarantined_until'] <= time.time():
+                p['strikes'] += 1
+                if p['strikes'] >= self.EVICT_STRIKES:
+                    p['evicted'] = True
+                    print('프록시 제외 : {} (오류율 {:.0%})'.format(proxy, p['error_rate']))
+                else:
+                    duration = min(self.MAX_QUARANTINE, self.QUARANTINE * 2 ** (p['strikes'] - 1))
+                    p['quarantined_until'] = time.time() + duration
+                    print('프록시 격리 : {} ({:.0f}초, 오류율 {:.0%})'.format(proxy, duration, p['error_rate']))
+                # On probation afterwards: probed once more, and a few more failures quarantine it again.
+                p['samples'] = self.MIN_SAMPLES - 1
+                p['probation'] = True
+
+    def probe_due(self):
+        # Proxies whose quarantine is over, to be probed before live traffic finds out whether they recovered.
+        with self.lock:
+            now = time.time()
+            return [proxy for proxy, p in self.proxies.items()
+                    if not p['evicted'] and p['probation'] and p['quarantined_until'] <= now]
+
+    def snapshot(self):
+        with self.lock:
+            return {proxy: dict(p) for proxy, p in self.proxies.items()}
+
+
+class ProxyPoolManager(BaseManager):
+    pass
+
+
+ProxyPoolManager.register('ProxyPoolState', ProxyPoolState)
+
+
+class ProxyPool:
+    # Same layout as RateLimiter: the state lives in a manager process so every worker sees the same scores.
+    PROBE_URL = 'https://www.google.com/generate_204'
+    PROBE_TIMEOUT = 10
+    PROBE_INTERVAL = 30
+
+    def __init__(self, state):
+        self.state = state
+        self.manager = None
+        self.prober = None
+        self.stop_event = None
+
+    @classmethod
+    def local(cls, proxies):
+        return cls(ProxyPoolState(proxies))
+
+    @classmethod
+    def shared(cls, proxies):
+        manager = ProxyPoolManager()
+        manager.start()
+        pool = cls(manager.ProxyPoolState(proxies))
+        pool.manager = manager
+        return pool
+
+    def __getstate__(self):
+        return {'state': self.state}
+
+    def __setstate__(self, state):
+        self.__init__(state['state'])
+
+    def assign(self, key, prefer=()):
+        proxy = self.state.assign(key, list(prefer))
+        if proxy is None:
+            raise NoHealthyProxy('사용 가능한 프록시가 없습니다')
+        return proxy
+
+    def release(self, key):
+        self.state.release(key)
+
+    def report(self, proxy, ok, latency=None, probe=False):
+        self.state.feedback(proxy, ok, latency, probe)
+
+    def probe(self, proxy):
+        start = time.time()
+        try:
+            response = requests.get(self.PROBE_URL, proxies={'http': proxy_url(proxy), 'https': proxy_url(proxy)},
+                                    timeout=self.PROBE_TIMEOUT)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        self.report(proxy, ok, time.time() - start, probe=True)
+        return ok
+
+    def probe_all(self, proxies=None):
+        proxies = list(self.state.snapshot()) if proxies is None else proxies
+        if not proxies:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(32, len(proxies))) as executor:
+            return sum(executor.map(self.probe, proxies))
+
+    def start_prober(self):
+        # Probes every proxy once up front, then re-probes quarantined proxies as their quarantine runs out.
+        healthy = self.probe_all()
+        print('프록시 검사 : {} / {} 응답'.format(healthy, len(self.state.snapshot())))
+
+        self.stop_event = threading.Event()
+
+        def run():
+            while not self.stop_event.wait(self.PROBE_INTERVAL):
+                self.probe_all(self.state.probe_due())
+
+        self.prober = threading.Thread(target=run, daemon=True)
+        self.prober.start()
+
+    def summary(self):
+        for proxy, p in sorted(self.state.snapshot().items()):
+            if p['evicted']:
+                status = '제외'
+            elif p['quarantined_until'] > time.time():
+                status = '격리'
+            else:
+                status = '정상'
+            print('프록시 {} - {}, 성공 : {}, 실패 : {}, 오류율 : {:.0%}, 지연 : {:.2f}s'
+                  .format(proxy, status, p['ok'], p['failed'], p['error_rate'], p['latency']))
+
+    def shutdown(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+            self.prober.join()
+        if self.manager is not None:
+            self.manager.shutdown()
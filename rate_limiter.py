@@ -0,0 +1,116 @@
+import time
+import threading
+from urllib.parse import urlsplit
+from multiprocessing.managers import BaseManager
+
+
+class RateLimitState:
+    # Token buckets keyed by (kind, host). Throttling signals halve a host's rate and pause it for a cool-down,
+    # successes win the rate back a little at a time (AIMD), so the crawl settles just under the point of blocking.
+    MIN_FACTOR = 1 / 16
+    RECOVERY = 0.05
+    COOLDOWN = 30.0
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def bucket(self, kind, host, now):
+        key = (kind, host)
+        if key not in self.buckets:
+            rate = self.rates.get(kind, 0)
+            self.buckets[key] = {'tokens': max(rate, 1.0), 'last': now, 'factor': 1.0, 'paused_until': 0.0,
+                                 'throttled': 0}
+        return self.buckets[key]
+
+    def reserve(self, kind, host):
+        # Takes one token and returns how long the caller has to wait before using it.
+        rate = self.rates.get(kind, 0)
+        if rate <= 0:
+            return 0.0
+
+        with self.lock:
+            now = time.time()
+            b = self.bucket(kind, host, now)
+            effective = rate * b['factor']
+            burst = max(rate, 1.0)
+
+            b['tokens'] = min(burst, b['tokens'] + (now - b['last']) * effective)
+            b['last'] = now
+            b['tokens'] -= 1
+
+            wait = -b['tokens'] / effective if b['tokens'] < 0 else 0.0
+            return max(wait, b['paused_until'] - now)
+
+    def feedback(self, kind, host, throttled, retry_after=None):
+        if self.rates.get(kind, 0) <= 0:
+            return
+
+        with self.lock:
+            now = time.time()
+            b = self.bucket(kind, host, now)
+            if throttled:
+                b['factor'] = max(self.MIN_FACTOR, b['factor'] / 2)
+                b['paused_until'] = now + (retry_after if retry_after else self.COOLDOWN)
+                b['tokens'] = min(b['tokens'], 0.0)
+                b['throttled'] += 1
+            else:
+                b['factor'] = min(1.0, b['factor'] + self.RECOVERY * b['factor'])
+
+    def snapshot(self):
+        with self.lock:
+            return {'{}:{}'.format(kind, host): dict(b) for (kind, host), b in self.buckets.items()}
+
+
+class RateLimitManager(BaseManager):
+    pass
+
+
+RateLimitManager.register('RateLimitState', RateLimitState)
+
+
+class RateLimiter:
+    PAGE = 'page'
+    IMAGE = 'image'
+
+    def __init__(self, state):
+        self.state = state
+
+    @classmethod
+    def local(cls, page_rate=0.5, image_rate=10):
+        return cls(RateLimitState({cls.PAGE: page_rate, cls.IMAGE: image_rate}))
+
+    @classmethod
+    def shared(cls, page_rate=0.5, image_rate=10):
+        # The state lives in a manager process; the returned limiter pickles into worker processes as a proxy.
+        manager = RateLimitManager()
+        manager.start()
+        limiter = cls(manager.RateLimitState({cls.PAGE: page_rate, cls.IMAGE: image_rate}))
+        limiter.manager = manager
+        return limiter
+
+    def __getstate__(self):
+        return {'state': self.state}
+
+    @staticmethod
+    def host(url):
+        return urlsplit(url).netloc
+
+    def wait(self, kind, url):
+        delay = self.state.reserve(kind, self.host(url))
+        if delay > 0:
+            time.sleep(delay)
+
+    def report(self, kind, url, throttled=False, retry_after=None, reason=None):
+        if throttled:
+            print('차단 감지, 속도를 낮춥니다 : {} ({})'.format(self.host(url), reason))
+        self.state.feedback(kind, self.host(url), throttled, retry_after)
+
+    def snapshot(self):
+        return self.state.snapshot()
+
+    def shutdown(self):
+        manager = getattr(self, 'manager', None)
+        if manager is not None:
+            manager.shutdown()
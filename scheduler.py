@@ -0,0 +1,312 @@
+import os
+import time
+import queue
+import random
+import signal
+import cProfile
+import threading
+import multiprocessing as mp
+from collections import Counter, deque
+from metrics import Metrics, get_metrics
+
+
+class Task:
+    def __init__(self, keyword, site_code, site_name):
+        self.keyword = keyword
+        self.site_code = site_code
+        self.site_name = site_name
+        self.attempts = 0
+        self.not_before = 0.0
+        self.elapsed = 0.0
+        self.state = 'pending'
+        self.error = None
+
+    @property
+    def key(self):
+        return self.keyword, self.site_code
+
+    def as_dict(self):
+        return {'keyword': self.keyword, 'site': self.site_name, 'state': self.state, 'attempts': self.attempts,
+                'elapsed': round(self.elapsed, 3), 'error': self.error}
+
+
+def worker_main(worker_id, crawler, inbox, outbox, profile_dir=None, slots=1):
+    if hasattr(os, 'setsid'):
+        # Own process group, so a timeout can take chromedriver and Chrome down together with the worker.
+        os.setsid()
+
+    # Further slots run tasks on threads of the same process, e.g. in other windows of its browser (--tabs).
+    threads = [threading.Thread(target=worker_loop, args=(worker_id, crawler, inbox, outbox, profile_dir, slot),
+                                daemon=True) for slot in range(1, slots)]
+    for thread in threads:
+        thread.start()
+    worker_loop(worker_id, crawler, inbox, outbox, profile_dir)
+    for thread in threads:
+        thread.join()
+
+
+def worker_loop(worker_id, crawler, inbox, outbox, profile_dir=None, slot=0):
+    profiler = cProfile.Profile() if profile_dir else None
+    profile_name = 'worker-{}-{}.prof'.format(worker_id, os.getpid()) if slot == 0 else \
+        'worker-{}-{}-{}.prof'.format(worker_id, os.getpid(), slot)
+
+    while True:
+        item = inbox.get()
+        if item is None:
+            break
+
+        seq, keyword, site_code = item
+        start = time.time()
+        error = None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            crawler.download_from_site(keyword, site_code)
+        except Exception as e:
+            error = '{}'.format(e) or type(e).__name__
+        finally:
+            if profiler is not None:
+                # Dumped after every task: a worker killed for a timeout keeps the profile of its earlier tasks.
+                profiler.disable()
+                profiler.dump_stats(os.path.join(profile_dir, profile_name))
+
+        outbox.put((worker_id, seq, error, time.time() - start, get_metrics().drain()))
+
+
+class Worker:
+    def __init__(self, worker_id, crawler, outbox, profile_dir=None, slots=1):
+        self.worker_id = worker_id
+        self.slots = slots
+        self.inbox = mp.Queue()
+        self.process = mp.Process(target=worker_main,
+                                  args=(worker_id, crawler, self.inbox, outbox, profile_dir, slots), daemon=True)
+        self.process.start()
+        # seq -> task and seq -> deadline of the tasks running in the worker.
+        self.tasks = {}
+        self.deadlines = {}
+
+    @property
+    def free(self):
+        return self.slots - len(self.tasks)
+
+    def assign(self, task, seq, timeout):
+        self.tasks[seq] = task
+        self.deadlines[seq] = time.time() + timeout if timeout else None
+        self.inbox.put((seq,) + task.key)
+
+    def kill(self):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.terminate()
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.join(5)
+
+    def stop(self):
+        for _ in range(self.slots):
+            self.inbox.put(None)
+
+
+class Scheduler:
+    def __init__(self, crawler, n_workers=4, site_limits=None, task_timeout=1200, max_retries=2, backoff=30,
+                 profile_dir=None, source=None, slots=1):
+        self.crawler = crawler
+        # Tasks a worker process runs at once.
+        self.slots = slots
+        # Optional shared work queue (work_queue.WorkQueue) that tasks are leased from while the run goes on.
+        self.source = source
+        self.last_heartbeat = 0.0
+        self.next_lease = 0.0
+        self.profile_dir = profile_dir
+        self.n_workers = n_workers
+        self.site_limits = site_limits or {}
+        self.task_timeout = task_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.outbox = mp.Queue()
+        self.workers = []
+        self.pending = deque()
+        self.tasks = []
+        self.site_running = Counter()
+        self.stats = Counter()
+        self.metrics = Metrics()
+        self.seq = 0
+
+    def add(self, keyword, site_code, site_name):
+        task = Task(keyword, site_code, site_name)
+        self.tasks.append(task)
+        self.pending.append(task)
+
+    def refill(self):
+        # Leases only as many tasks as there are idle workers, so the other nodes get the rest of the queue.
+        now = time.time()
+        idle = sum(worker.free for worker in self.workers) - len(self.pending)
+        if idle > 0 and now >= self.next_lease:
+            leased = self.source.lease(idle)
+            for keyword, site_code, site_name in leased:
+                self.add(keyword, site_code, site_name)
+            # An empty queue is polled less often, it lives on shared storage.
+            self.next_lease = now if leased else now + 5
+
+        if now - self.last_heartbeat >= self.source.heartbeat_interval:
+            self.source.heartbeat()
+            self.last_heartbeat = now
+
+    def has_work(self):
+        if self.pending or any(worker.tasks for worker in self.workers):
+            return True
+        # Tasks leased by other nodes may still come back if their node dies, so wait until the queue is finished.
+        return self.source is not None and not self.source.finished()
+
+    def next_task(self):
+        # Any idle worker takes the first eligible task of any site, so a slow site never idles the pool.
+        now = time.time()
+        for task in self.pending:
+            limit = self.site_limits.get(task.site_name, 0)
+            if task.not_before <= now and (not limit or self.site_running[task.site_name] < limit):
+                self.pending.remove(task)
+                return task
+        return None
+
+    def dispatch(self):
+        for worker in self.workers:
+            while worker.free > 0:
+                task = self.next_task()
+                if task is None:
+                    return
+                task.attempts += 1
+                task.state = 'running'
+                self.site_running[task.site_name] += 1
+                self.seq += 1
+                worker.assign(task, self.seq, self.task_timeout)
+
+    def finish(self, worker, seq, error, elapsed):
+        task = worker.tasks.pop(seq)
+        del worker.deadlines[seq]
+        self.site_running[task.site_name] -= 1
+        task.elapsed += elapsed
+        task.error = error
+
+        if error is None:
+            task.state = 'done'
+            self.stats['done'] += 1
+            self.complete(task)
+        elif task.attempts <= self.max_retries:
+            task.state = 'pending'
+            task.not_before = time.time() + self.backoff * (2 ** (task.attempts - 1)) * random.uniform(0.5, 1.5)
+            self.pending.append(task)
+            self.stats['retried'] += 1
+            self.metrics.inc('retries', task.site_name)
+            print('재시도 예정 {}:{} ({}회차) - {}'.format(task.site_name, task.keyword, task.attempts, error))
+        else:
+            task.state = 'failed'
+            self.stats['failed'] += 1
+            self.complete(task)
+            print('작업 실패 {}:{} - {}'.format(task.site_name, task.keyword, error))
+
+    def requeue(self, worker, seq):
+        # A task that only shared the process of a timed out one: straight back to the queue, without backoff and
+        # without losing an attempt, and not counted as a retry.
+        task = worker.tasks.pop(seq)
+        del worker.deadlines[seq]
+        self.site_running[task.site_name] -= 1
+        task.attempts -= 1
+        task.state = 'pending'
+        task.not_before = 0.0
+        self.pending.append(task)
+
+    def complete(self, task):
+        if self.source is not None and not self.source.complete(task.keyword, task.site_code, task.error):
+            print('작업 임대가 만료되어 다른 노드가 맡았습니다 {}:{}'.format(task.site_name, task.keyword))
+
+    def replace(self, worker):
+        index = self.workers.index(worker)
+        self.workers[index] = Worker(worker.worker_id, self.crawler, self.outbox, self.profile_dir, self.slots)
+
+    def supervise(self):
+        now = time.time()
+        for worker in list(self.workers):
+            if not worker.tasks:
+                continue
+
+            expired = [seq for seq, deadline in worker.deadlines.items() if deadline is not None and now > deadline]
+            if expired:
+                worker.kill()
+                for seq in expired:
+                    task = worker.tasks[seq]
+                    print('작업 시간 초과, 워커 종료 {}:{}'.format(task.site_name, task.keyword))
+                    self.stats['timeouts'] += 1
+                    self.metrics.inc('timeouts', task.site_name)
+                    elapsed = self.task_timeout + now - worker.deadlines[seq]
+                    self.finish(worker, seq, '시간 초과 ({}s)'.format(self.task_timeout), elapsed)
+                for seq in list(worker.tasks):
+                    self.requeue(worker, seq)
+                self.replace(worker)
+
+            elif not worker.process.is_alive():
+                self.stats['crashes'] += 1
+                for seq in list(worker.tasks):
+                    self.finish(worker, seq, '워커 비정상 종료 (exitcode {})'.format(worker.process.exitcode), 0.0)
+                self.replace(worker)
+
+    def run(self):
+        start = time.time()
+        n_workers = self.n_workers if self.source is not None else \
+            min(self.n_workers, -(-len(self.tasks) // self.slots))
+        self.workers = [Worker(i, self.crawler, self.outbox, self.profile_dir, self.slots) for i in range(n_workers)]
+
+        try:
+            while self.has_work():
+                if self.source is not None:
+                    self.refill()
+                self.dispatch()
+
+                try:
+                    worker_id, seq, error, elapsed, metrics = self.outbox.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+                else:
+                    self.metrics.merge(metrics)
+                    # A result from a worker that was already killed for a timeout carries a stale seq.
+                    worker = self.workers[worker_id]
+                    if seq in worker.tasks:
+                        self.finish(worker, seq, error, elapsed)
+
+                self.supervise()
+        finally:
+            if self.source is not None:
+                self.source.release()
+            for worker in self.workers:
+                worker.stop()
+            for worker in self.workers:
+                worker.process.join(30)
+                if worker.process.is_alive():
+                    worker.kill()
+
+        return self.summary(time.time() - start)
+
+    def summary(self, elapsed):
+        summary = {
+            'elapsed': round(elapsed, 3),
+            'total': len(self.tasks),
+            'done': self.stats['done'],
+            'failed': self.stats['failed'],
+            'retried': self.stats['retried'],
+            'timeouts': self.stats['timeouts'],
+            'crashes': self.stats['crashes'],
+            'tasks': [task.as_dict() for task in self.tasks],
+        }
+
+        print('_________________________________')
+        print('작업 요약 - 전체 : {}, 완료 : {}, 실패 : {}, 재시도 : {}, 시간 초과 : {}, 워커 충돌 : {}, 소요 시간 : {:.1f}s'
+              .format(summary['total'], summary['done'], summary['failed'], summary['retried'], summary['timeouts'],
+                      summary['crashes'], elapsed))
+        for task in self.tasks:
+            if task.state == 'failed':
+                print('실패 : {} {} - {}'.format(task.site_name, task.keyword, task.error))
+        print('_________________________________')
+
+        return summary
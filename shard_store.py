@@ -0,0 +1,220 @@
+import os
+import json
+import mmap
+import glob
+import time
+import socket
+import struct
+import bisect
+import threading
+import multiprocessing.util
+
+
+# Packed output: images are appended to size bounded shard files instead of one file per image. Every record is
+# self-describing (magic, header length, data length, JSON header, bytes), and a finalized shard also gets a JSON
+# index with the data offsets. A shard only becomes visible to readers once its index exists, and both files are
+# renamed into place, so a reader never sees a half written shard.
+MAGIC = b'ACR1'
+RECORD_HEADER = struct.Struct('<4sII')
+
+
+class ShardWriter:
+    # One writer per process and one open shard per writer, so several processes append concurrently without locks.
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.file = None
+        self.name = None
+        self.records = []
+
+        os.makedirs(self.root, exist_ok=True)
+
+    def open(self):
+        self.seq += 1
+        self.name = 'shard-{}-{}-{}-{:05d}'.format(time.strftime('%Y%m%d%H%M%S'), socket.gethostname(), os.getpid(),
+                                                   self.seq)
+        self.file = open(os.path.join(self.root, self.name + '.bin.part'), 'wb')
+        self.records = []
+
+    def append(self, data, meta):
+        # Returns the record location "<shard>#<number>", which stays valid after the shard is finalized.
+        with self.lock:
+            if self.file is None:
+                self.open()
+
+            header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+            self.file.write(RECORD_HEADER.pack(MAGIC, len(header), len(data)))
+            self.file.write(header)
+            offset = self.file.tell()
+            self.file.write(data)
+            self.file.flush()
+
+            self.records.append(dict(meta, offset=offset, length=len(data)))
+            location = '{}#{}'.format(self.name, len(self.records) - 1)
+
+            if self.file.tell() >= self.max_bytes:
+                self.finalize()
+
+            return location
+
+    def finalize(self):
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        finalize_shard(self.root, self.name, self.records)
+
+    def close(self):
+        with self.lock:
+            self.finalize()
+
+
+def finalize_shard(root, name, records):
+    os.replace(os.path.join(root, name + '.bin.part'), os.path.join(root, name + '.bin'))
+
+    index_path = os.path.join(root, name + '.idx.json')
+    tmp_path = index_path + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'records': records}, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_path)
+
+
+def read_records(path):
+    # Scans a shard and returns the complete records; a torn record at the end (killed writer) is left out.
+    records = []
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        position = 0
+        while position + RECORD_HEADER.size <= size:
+            magic, header_length, data_length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            offset = position + RECORD_HEADER.size + header_length
+            if magic != MAGIC or offset + data_length > size:
+                break
+            meta = json.loads(f.read(header_length).decode('utf-8'))
+            records.append(dict(meta, offset=offset, length=data_length))
+            f.seek(data_length, os.SEEK_CUR)
+            position = offset + data_length
+    return records, position
+
+
+def location_exists(root, location):
+    # True for a "<shard>#<number>" record location whose shard is still there, or for an existing plain file.
+    if '#' not in location:
+        return os.path.exists(location)
+    name = location.rsplit('#', 1)[0]
+    return os.path.exists(os.path.join(root, name + '.bin')) or os.path.exists(os.path.join(root, name + '.bin.part'))
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def shard_writer(name):
+    # (host, pid) of the writer of a shard "shard-<time>-<host>-<pid>-<seq>"; host is None for the names of older
+    # versions, "shard-<time>-<pid>-<seq>".
+    fields = name.split('-', 2)[2].rsplit('-', 2)
+    if len(fields) < 3:
+        return None, int(fields[0])
+    return fields[0], int(fields[1])
+
+
+def recover_shards(root):
+    # Finalizes shards left open by writers that died (e.g. workers killed for a timeout). Only this host's writers
+    # can be checked: on shared storage another node's shard is left alone, its pid means nothing here.
+    recovered = 0
+    host = socket.gethostname()
+    for path in glob.glob(os.path.join(root, 'shard-*.bin.part')):
+        name = os.path.basename(path)[:-len('.bin.part')]
+        writer_host, pid = shard_writer(name)
+        if writer_host not in (None, host) or pid_alive(pid):
+            continue
+
+        records, end = read_records(path)
+        with open(path, 'r+b') as f:
+            f.truncate(end)
+        finalize_shard(root, name, records)
+        recovered += 1
+    return recovered
+
+
+class ShardReader:
+    def __init__(self, root):
+        self.root = root
+        self.shards = []
+        self.starts = []
+        self.maps = {}
+        self.positions = {}
+
+        total = 0
+        for index_path in sorted(glob.glob(os.path.join(root, 'shard-*.idx.json'))):
+            name = os.path.basename(index_path)[:-len('.idx.json')]
+            with open(index_path, encoding='utf-8') as f:
+                records = json.load(f)['records']
+            self.positions[name] = len(self.shards)
+            self.shards.append((name, records))
+            self.starts.append(total)
+            total += len(records)
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def data_map(self, name):
+        if name not in self.maps:
+            with open(os.path.join(self.root, name + '.bin'), 'rb') as f:
+                self.maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.maps[name]
+
+    def record(self, name, number):
+        # Returns (meta, bytes). Duplicates are stored as references to the record that holds the bytes.
+        meta = self.shards[self.positions[name]][1][number]
+        if 'ref' in meta:
+            target, data = self.locate(meta['ref'])
+            return dict(target, keyword=meta['keyword'], site=meta['site'], url=meta['url'], ref=meta['ref']), data
+        data = self.data_map(name)
+        return meta, data[meta['offset']:meta['offset'] + meta['length']]
+
+    def locate(self, location):
+        name, number = location.rsplit('#', 1)
+        return self.record(name, int(number))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.total
+        if not 0 <= index < self.total:
+            raise IndexError(index)
+        shard = bisect.bisect_right(self.starts, index) - 1
+        return self.record(self.shards[shard][0], index - self.starts[shard])
+
+    def __iter__(self):
+        for i in range(self.total):
+            yield self[i]
+
+    def close(self):
+        for data in self.maps.values():
+            data.close()
+        self.maps = {}
+
+
+_process_writers = {}
+
+
+def get_writer(root, max_bytes=1024 * 1024 * 1024):
+    key = (root, os.getpid())
+    if key not in _process_writers:
+        _process_writers[key] = ShardWriter(root, max_bytes=max_bytes)
+        # The open shard is finalized when the process exits; one left behind by a killed worker is recovered later.
+        multiprocessing.util.Finalize(None, _process_writers[key].close, exitpriority=10)
+    return _process_writers[key]
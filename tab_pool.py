@@ -0,0 +1,368 @@
+import time
+import threading
+import multiprocessing.util
+from collections import deque
+from contextlib import contextmanager
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from browser_pool import BrowserPool
+from collect_links import CollectLinks
+
+
+class SharedBrowser:
+    # One Chrome serving several collections at once, each in its own window. WebDriver drives one window at a time,
+    # so the windows take turns in the order they asked (round robin); a turn lasts until the collection has to wait
+    # for the page (CollectLinks.pause), and the other windows keep loading and rendering meanwhile.
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.session = None
+        self.browser = None
+        self.ready = threading.Event()
+        self.error = None
+
+        # Managed by the pool under its lock.
+        self.leased = 0
+        self.uses = 0
+        self.broken = False
+        self.last_used = time.time()
+
+        self.condition = threading.Condition()
+        self.waiting = deque()
+        self.holder = None
+        self.current = None
+        # The open window no tab uses: the first window of a new browser, or the last one after its tab left.
+        self.spare = None
+
+    def start(self, session):
+        self.session = session
+        self.browser = session.browser
+        self.current = self.spare = self.browser.current_window_handle
+        self.ready.set()
+
+    def fail(self, error):
+        self.error = error
+        self.broken = True
+        self.ready.set()
+
+    def acquire(self, handle=None):
+        ticket = object()
+        with self.condition:
+            self.waiting.append(ticket)
+            while self.holder is not None or self.waiting[0] is not ticket:
+                self.condition.wait()
+            self.waiting.popleft()
+            self.holder = threading.get_ident()
+
+        if handle is not None and handle != self.current:
+            try:
+                self.browser.switch_to.window(handle)
+            except BaseException:
+                self.release()
+                raise
+            self.current = handle
+
+    def release(self):
+        with self.condition:
+            if self.holder == threading.get_ident():
+                self.holder = None
+                self.condition.notify_all()
+
+    def holds_turn(self):
+        return self.holder == threading.get_ident()
+
+    @contextmanager
+    def turn(self, handle=None):
+        self.acquire(handle)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def open_window(self):
+        # During a turn. A separate window rather than a background tab, so Chrome keeps rendering it and the lazy
+        # loading of the result grid goes on while another window is in front.
+        if self.spare is not None:
+            handle, self.spare = self.spare, None
+        else:
+            old_handles = set(self.browser.window_handles)
+            self.browser.execute_cdp_cmd('Target.createTarget', {'url': 'about:blank', 'newWindow': True})
+            handle = [h for h in self.browser.window_handles if h not in old_handles][0]
+
+        self.browser.switch_to.window(handle)
+        self.current = handle
+        try:
+            # Scripts that wait for focus (e.g. infinite scroll handlers) see every window as focused.
+            self.browser.execute_cdp_cmd('Emulation.setFocusEmulationEnabled', {'enabled': True})
+        except Exception:
+            pass
+        return handle
+
+    def close_window(self, handle):
+        # During a turn on handle. The last window is kept as the spare one, closing it would end the session.
+        if len(self.browser.window_handles) > 1:
+            self.browser.close()
+            self.current = None
+            return
+
+        try:
+            self.browser.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        except Exception:
+            self.browser.delete_all_cookies()
+        self.browser.get('about:blank')
+        self.spare = handle
+
+
+class Tab:
+    QUANTUM = 0.05
+
+    def __init__(self, shared, handle):
+        self.shared = shared
+        self.handle = handle
+
+    @contextmanager
+    def active(self):
+        with self.shared.turn(self.handle):
+            yield
+
+    @contextmanager
+    def released(self):
+        # Gives the turn up for a wait that does not need the browser, and takes it back afterwards.
+        if not self.shared.holds_turn():
+            yield
+            return
+        self.shared.release()
+        try:
+            yield
+        finally:
+            self.shared.acquire(self.handle)
+
+    def pause(self, seconds):
+        with self.released():
+            time.sleep(seconds)
+
+    def drive(self, links):
+        # Runs a collection generator in turns. A turn pulls links until the collection had to wait for the page
+        # (or for QUANTUM), and the links are handed on once the turn is over.
+        try:
+            while True:
+                batch = []
+                finished = False
+                with self.active():
+                    start = time.time()
+                    for link in links:
+                        batch.append(link)
+                        if time.time() - start >= self.QUANTUM:
+                            break
+                    else:
+                        finished = True
+
+                yield from batch
+                if finished:
+                    return
+        finally:
+            with self.active():
+                links.close()
+
+
+class TabCollectLinks(CollectLinks):
+    # CollectLinks on one window of a shared browser: browser commands only run during the window's turns.
+    def __init__(self, tab, **kwargs):
+        self.tab = tab
+        with tab.active():
+            super().__init__(browser=tab.shared.browser, **kwargs)
+
+    def pause(self, seconds):
+        self.tab.pause(seconds)
+
+    def wait_for(self, xpath, timeout=10):
+        # Polled instead of WebDriverWait, which would keep the turn for the whole wait.
+        deadline = time.time() + timeout
+        while self.count_elements(xpath) == 0:
+            if time.time() > deadline:
+                return False
+            self.pause(self.POLL_INTERVAL)
+        return True
+
+    def wait_clickable(self, xpath, timeout=15):
+        # Polled like wait_for.
+        deadline = time.time() + timeout
+        clickable = EC.element_to_be_clickable((By.XPATH, xpath))
+        while True:
+            try:
+                elem = clickable(self.browser)
+            except NoSuchElementException:
+                elem = False
+            if elem:
+                return elem
+            if time.time() > deadline:
+                raise TimeoutException('클릭 시간 초과 - {}'.format(xpath))
+            self.pause(self.POLL_INTERVAL)
+
+    def throttle(self, url):
+        # The wait for the rate limiter does not keep the turn either.
+        with self.tab.released():
+            super().throttle(url)
+
+    def iter_google(self, keyword, add_url="", limit=0):
+        return self.tab.drive(super().iter_google(keyword, add_url, limit=limit))
+
+    def iter_naver(self, keyword, add_url="", limit=0):
+        return self.tab.drive(super().iter_naver(keyword, add_url, limit=limit))
+
+    def iter_google_full(self, keyword, add_url="", limit=0):
+        return self.tab.drive(super().iter_google_full(keyword, add_url, limit=limit))
+
+    def iter_naver_full(self, keyword, add_url="", limit=0):
+        return self.tab.drive(super().iter_naver_full(keyword, add_url, limit=limit))
+
+
+class TabPool(BrowserPool):
+    # Like BrowserPool, but a browser is leased to up to tabs collections at once, one window each, so the memory of
+    # a Chrome process is shared by several keywords. The capture is not supported, its log is per browser.
+    def __init__(self, no_gui=False, driver_path=None, max_uses=20, max_idle=2, profile='default', block_images=False,
+                 tabs=4):
+        super().__init__(no_gui=no_gui, driver_path=driver_path, max_uses=max_uses, max_idle=max_idle,
+                         capture_images=False, profile=profile, block_images=block_images, tabs=tabs)
+        self.browsers = []
+        self.stats['peak_tabs'] = 0
+
+    def find_browser(self, proxy):
+        # The fullest browser with room for another window, so browsers fill up before new ones are launched.
+        candidates = [b for b in self.browsers if b.proxy == proxy and not b.broken and b.leased < self.tabs and
+                      b.uses + b.leased < self.max_uses]
+        return max(candidates, key=lambda b: b.leased, default=None)
+
+    def acquire_tab(self, proxy=None):
+        while True:
+            with self.lock:
+                shared = self.find_browser(proxy)
+                created = shared is None
+                if created:
+                    # Registered before it is launched, so concurrent leases wait for it instead of launching more.
+                    shared = SharedBrowser(proxy)
+                    self.browsers.append(shared)
+                else:
+                    self.stats['reused'] += 1
+                was_idle = not created and shared.leased == 0
+                shared.leased += 1
+                self.stats['leased'] += 1
+                self.stats['peak_tabs'] = max(self.stats['peak_tabs'], shared.leased)
+
+            if created:
+                try:
+                    shared.start(self.create_session(proxy))
+                except Exception as e:
+                    shared.fail(e)
+            shared.ready.wait()
+            if shared.error is not None:
+                self.release_tab(Tab(shared, None), healthy=False)
+                raise shared.error
+
+            try:
+                with shared.turn():
+                    if was_idle and not self.is_alive(shared.session):
+                        raise ConnectionError('브라우저 응답 없음')
+                    handle = shared.open_window()
+            except Exception:
+                self.release_tab(Tab(shared, None), healthy=False)
+                if was_idle:
+                    # An idle browser that died in the meantime, another one is taken.
+                    continue
+                raise
+
+            return Tab(shared, handle)
+
+    def release_tab(self, tab, healthy=True):
+        shared = tab.shared
+        # Measured before the window is closed, while the result page of the task is still loaded.
+        rss = self.browser_rss(shared.session) if shared.session is not None else 0
+
+        if healthy and tab.handle is not None:
+            try:
+                with shared.turn(tab.handle):
+                    shared.close_window(tab.handle)
+            except Exception as e:
+                print('탭 정리 실패 - {}'.format(e))
+                healthy = False
+
+        retired = None
+        with self.lock:
+            self.stats['peak_rss'] = max(self.stats['peak_rss'], rss)
+            shared.leased -= 1
+            if tab.handle is not None:
+                shared.uses += 1
+            shared.last_used = time.time()
+            if not healthy and not shared.broken:
+                shared.broken = True
+                self.stats['crashed'] += 1
+
+            if shared.leased == 0:
+                if shared.broken or shared.uses >= self.max_uses:
+                    retired = shared
+                    if not shared.broken:
+                        self.stats['recycled'] += 1
+                else:
+                    # Idle browsers are kept per proxy, the least recently used one makes room for the newest.
+                    idle = [b for b in self.browsers if b.leased == 0]
+                    if len(idle) > self.max_idle:
+                        retired = min(idle, key=lambda b: b.last_used)
+                        self.stats['recycled'] += 1
+                if retired is not None:
+                    self.browsers.remove(retired)
+
+        if retired is not None and retired.session is not None:
+            self.quit_session(retired.session)
+
+    def tab_alive(self, tab):
+        try:
+            with tab.active():
+                return self.is_alive(tab.shared.session)
+        except Exception:
+            return False
+
+    @contextmanager
+    def lease(self, proxy=None, **collect_kwargs):
+        tab = self.acquire_tab(proxy)
+        healthy = True
+        try:
+            yield TabCollectLinks(tab, proxy=proxy, profile=self.profile, **collect_kwargs)
+        except Exception:
+            healthy = self.tab_alive(tab)
+            raise
+        finally:
+            self.release_tab(tab, healthy=healthy)
+
+    def idle_proxies(self):
+        # Proxies whose browser has room for another window, so a task can be given one of them without a launch.
+        with self.lock:
+            return [b.proxy for b in self.browsers if b.proxy and not b.broken and b.leased < self.tabs]
+
+    def report(self):
+        stats = super().report()
+        print('탭 - 브라우저당 최대 : {}, 동시 사용 최대 : {}'.format(self.tabs, stats['peak_tabs']))
+        return stats
+
+    def close(self):
+        with self.lock:
+            browsers = self.browsers
+            self.browsers = []
+
+        for shared in browsers:
+            if shared.session is not None:
+                self.quit_session(shared.session)
+
+        if self.stats['leased'] > 0:
+            self.report()
+
+
+_process_tab_pool = None
+
+
+def get_tab_pool(no_gui=False, driver_path=None, max_uses=20, profile='default', block_images=False, tabs=4):
+    global _process_tab_pool
+    if _process_tab_pool is None:
+        _process_tab_pool = TabPool(no_gui=no_gui, driver_path=driver_path, max_uses=max_uses, profile=profile,
+                                    block_images=block_images, tabs=tabs)
+        multiprocessing.util.Finalize(None, _process_tab_pool.close, exitpriority=10)
+    return _process_tab_pool
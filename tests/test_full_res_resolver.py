@@ -0,0 +1,63 @@
+import os
+import unittest
+
+from full_res_resolver import google_original_urls, naver_original_urls, naver_original_from_thumbnail
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class GoogleOriginalUrlsTest(unittest.TestCase):
+    def test_originals_in_result_order(self):
+        self.assertEqual(google_original_urls(read_fixture('google.html')), [
+            'https://upload.wikimedia.org/wikipedia/commons/thumb/3/3a/Cat03.jpg/1200px-Cat03.jpg',
+            'https://cdn.example.co.kr/upload/images/kitten.jpg?w=1280&h=853',
+            'https://img.example.com/photos/cat "tabby".png',
+        ])
+
+    def test_thumbnails_and_page_assets_are_skipped(self):
+        urls = google_original_urls(read_fixture('google.html'))
+        self.assertFalse([url for url in urls if 'gstatic.com' in url])
+
+    def test_page_without_result_data(self):
+        self.assertEqual(google_original_urls('<html><body>검색결과가 없습니다.</body></html>'), [])
+
+
+class NaverOriginalUrlsTest(unittest.TestCase):
+    THUMBNAILS = [
+        'https://search.pstatic.net/common/?src=http%3A%2F%2Fblogfiles.naver.net%2FMjAyMzA1MTJfMTQ3%2Fcat_01.jpg'
+        '&type=a340',
+        'https://search.pstatic.net/sunny/?src=https%3A%2F%2Fimg.example.co.kr%2Fdata%2Fcat%20two.png&type=b400',
+        'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7',
+    ]
+
+    def test_embedded_originals(self):
+        self.assertEqual(naver_original_urls(read_fixture('naver.html')), [
+            'http://blogfiles.naver.net/MjAyMzA1MTJfMTQ3/cat_01.jpg',
+            'https://post-phinf.pstatic.net/20230301_2/cat_03.jpg?type=w1200',
+        ])
+
+    def test_thumbnails_add_the_originals_not_embedded(self):
+        self.assertEqual(naver_original_urls(read_fixture('naver.html'), self.THUMBNAILS), [
+            'http://blogfiles.naver.net/MjAyMzA1MTJfMTQ3/cat_01.jpg',
+            'https://post-phinf.pstatic.net/20230301_2/cat_03.jpg?type=w1200',
+            'https://img.example.co.kr/data/cat two.png',
+        ])
+
+    def test_thumbnails_only(self):
+        self.assertEqual(naver_original_urls('', self.THUMBNAILS), [
+            'http://blogfiles.naver.net/MjAyMzA1MTJfMTQ3/cat_01.jpg',
+            'https://img.example.co.kr/data/cat two.png',
+        ])
+
+    def test_foreign_thumbnail(self):
+        self.assertIsNone(naver_original_from_thumbnail('https://example.com/thumb?src=https%3A%2F%2Fa.com%2Fb.jpg'))
+
+
+if __name__ == '__main__':
+    unittest.main()
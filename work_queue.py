@@ -0,0 +1,113 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+
+
+class WorkQueue:
+    # (keyword, site) tasks shared by several crawler nodes through one SQLite file on shared storage. A node leases
+    # tasks for lease_time seconds and keeps extending the lease while it works on them; when a node dies its leases
+    # run out and another node picks the tasks up.
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, path, node_id=None, lease_time=300):
+        self.path = path
+        self.node_id = node_id or '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.lease_time = lease_time
+        self.heartbeat_interval = lease_time / 3
+        self.lock = threading.Lock()
+
+        # No WAL: its shared memory index does not work across machines, a rollback journal does.
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS queue (
+                keyword TEXT NOT NULL,
+                site_code INTEGER NOT NULL,
+                site TEXT NOT NULL,
+                state TEXT NOT NULL,
+                owner TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (keyword, site_code)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS queue_state ON queue (state, lease_until)')
+
+    def add(self, keyword, site_code, site):
+        with self.lock:
+            self.conn.execute('INSERT OR IGNORE INTO queue (keyword, site_code, site, state, updated) '
+                              'VALUES (?, ?, ?, ?, ?)', (keyword, site_code, site, self.PENDING, time.time()))
+
+    def lease(self, n):
+        # Atomically claims up to n pending tasks or tasks whose lease has run out. Returns [(keyword, code, site)].
+        if n <= 0:
+            return []
+
+        with self.lock:
+            now = time.time()
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.conn.execute('SELECT keyword, site_code, site FROM queue '
+                                         'WHERE state = ? OR (state = ? AND lease_until < ?) '
+                                         'ORDER BY attempts, updated LIMIT ?',
+                                         (self.PENDING, self.LEASED, now, n)).fetchall()
+                for keyword, site_code, site in rows:
+                    self.conn.execute('UPDATE queue SET state = ?, owner = ?, lease_until = ?, '
+                                      'attempts = attempts + 1, updated = ? WHERE keyword = ? AND site_code = ?',
+                                      (self.LEASED, self.node_id, now + self.lease_time, now, keyword, site_code))
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+
+        return rows
+
+    def heartbeat(self):
+        with self.lock:
+            self.conn.execute('UPDATE queue SET lease_until = ? WHERE state = ? AND owner = ?',
+                              (time.time() + self.lease_time, self.LEASED, self.node_id))
+
+    def complete(self, keyword, site_code, error=None):
+        # Only the current owner may finish a task; a node that lost its lease (e.g. after a network partition) must
+        # not overwrite the result of the node that took over.
+        with self.lock:
+            cursor = self.conn.execute('UPDATE queue SET state = ?, error = ?, updated = ? '
+                                       'WHERE keyword = ? AND site_code = ? AND state = ? AND owner = ?',
+                                       (self.FAILED if error else self.DONE, error, time.time(), keyword, site_code,
+                                        self.LEASED, self.node_id))
+        return cursor.rowcount == 1
+
+    def release(self):
+        # Hands unfinished tasks back right away instead of letting their leases run out, e.g. on Ctrl+C.
+        with self.lock:
+            self.conn.execute('UPDATE queue SET state = ?, owner = NULL, lease_until = 0 WHERE state = ? AND owner = ?',
+                              (self.PENDING, self.LEASED, self.node_id))
+
+    def finished(self):
+        # True once no task is pending or leased by any node.
+        with self.lock:
+            row = self.conn.execute('SELECT COUNT(*) FROM queue WHERE state IN (?, ?)',
+                                    (self.PENDING, self.LEASED)).fetchone()
+        return row[0] == 0
+
+    def completed_by(self, node_id=None):
+        with self.lock:
+            rows = self.conn.execute('SELECT keyword, site FROM queue WHERE state = ? AND owner = ?',
+                                     (self.DONE, node_id or self.node_id)).fetchall()
+        return set(rows)
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT state, COUNT(*) FROM queue GROUP BY state').fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()